@@ -26,43 +26,62 @@ bl_info = {
 }
 
 
-import bpy
-from bpy.types import (
-    ShaderNodeTexImage,
-    WindowManager,
-    )
-from bpy.utils import (
-    register_class,
-    unregister_class,
-    )
-from bpy.props import (
-    RemoveProperty,
-    PointerProperty,
-    IntProperty,
-    CollectionProperty
-    )
-from bpy.app import handlers
-from . import ops
-from . import ui
-from .keymaps import setup_keymaps
-
-#from . import auto_load
-#auto_load.init()
-
-register_classes = [
-    ops.ANIM_OT_insert_animtexture,
-    ops.ANIM_OT_duplicate_animtexture,
-    ops.ANIM_OT_save_animtexture,
-    ops.ANIM_OT_import_animtexture,
-    ops.ANIM_OT_import_set_working_directory_animtexture,
-    ops.ANIM_OT_import_single_animtexture,
-    ops.ANIM_OT_export_animtexture,
-    ops.ANIM_OT_openimage_animtexture,
-    ops.ANIM_OT_insertdelete_animtexture,
-    ops.ANIM_OT_insertmissingtemplate_animtexture,
-    ui.AnimtextureAddonPreferences,
-    ui.VIEW3D_PT_animtexture,
-    ]
+try:
+    import bpy
+except ImportError:
+    # without Blender only the bpy-free modules (core, cli) are usable
+    bpy = None
+
+if bpy:
+    from bpy.types import (
+        ShaderNodeTexImage,
+        WindowManager,
+        )
+    from bpy.utils import (
+        register_class,
+        unregister_class,
+        )
+    from bpy.props import (
+        RemoveProperty,
+        PointerProperty,
+        IntProperty,
+        EnumProperty,
+        CollectionProperty
+        )
+    from bpy.app import handlers
+    from . import ops
+    from . import ui
+    from . import prefetch
+    from . import container
+    from . import materialize
+    from . import editors
+    from . import stats
+    from .keymaps import setup_keymaps
+
+    #from . import auto_load
+    #auto_load.init()
+
+    register_classes = [
+        ops.ANIM_OT_insert_animtexture,
+        ops.ANIM_OT_duplicate_animtexture,
+        ops.ANIM_OT_save_animtexture,
+        ops.ANIM_OT_save_async_animtexture,
+        ops.ANIM_OT_import_animtexture,
+        ops.ANIM_OT_import_set_working_directory_animtexture,
+        ops.ANIM_OT_import_single_animtexture,
+        ops.ANIM_OT_export_animtexture,
+        ops.ANIM_OT_bake_animtexture,
+        ops.ANIM_OT_proxy_animtexture,
+        ops.ANIM_OT_sparse_animtexture,
+        ops.ANIM_OT_container_animtexture,
+        ops.ANIM_OT_onion_animtexture,
+        ops.ANIM_OT_stats_animtexture,
+        ops.ANIM_OT_openimage_animtexture,
+        ops.ANIM_OT_insertdelete_animtexture,
+        ops.ANIM_OT_insertmissingtemplate_animtexture,
+        ui.AnimtextureAddonPreferences,
+        ui.VIEW3D_PT_animtexture,
+        ]
 addon_keymaps = []
 
 def register():
@@ -77,15 +96,31 @@ def register():
         get=ops.animtexturekey_get,
         set=ops.animtexturekey_set)
     ShaderNodeTexImage.animtexturekeynext = IntProperty("key", default=0)
+    """Resolution of the images during viewport playback."""
+    ShaderNodeTexImage.animtextureproxy = EnumProperty(
+        name="Playback Proxy",
+        items=[
+            ('NONE', 'Full', 'Play back the full resolution images'),
+            ('HALF', '1/2', 'Play back images with half the resolution'),
+            ('QUARTER', '1/4', 'Play back images with a quarter of the resolution')],
+        default='NONE')
     
     # TODO is this really how you attach frame change handlers in addons?
     handlers.frame_change_pre.append(ops.animtexture_framechange)
     handlers.load_pre.append(ops.animtexture_loadpre)
     handlers.load_post.append(ops.animtexture_loadpost)
+    handlers.depsgraph_update_post.append(ops.animtexture_depsgraph_update)
+    handlers.undo_post.append(ops.animtexture_undo)
+    handlers.redo_post.append(ops.animtexture_undo)
+    handlers.render_pre.append(ops.animtexture_proxy_restore)
+    handlers.save_pre.append(ops.animtexture_proxy_restore)
+    editors.subscribe()
 
 
     if bpy.context.preferences.addons[__package__].preferences.savewithfile != 'DONT_SAVE':
         handlers.save_pre.append(ops.animtexture_savewithfile)
+    if bpy.context.preferences.addons[__package__].preferences.collectStats:
+        stats.enabled = True
     if bpy.context.preferences.addons[__package__].preferences.checklinks:
         handlers.load_post.append(ops.animtexture_checklinks)
         
@@ -105,15 +140,24 @@ def unregister():
 
     for handlertype in [
             handlers.frame_change_pre, handlers.save_pre,
-            handlers.load_pre, handlers.load_post]:
+            handlers.load_pre, handlers.load_post,
+            handlers.depsgraph_update_post, handlers.render_pre,
+            handlers.undo_post, handlers.redo_post]:
         itemstodetach = [f for f in handlertype
             if f.__module__ == "animtexture.ops"]
         while itemstodetach:
             handlertype.remove(itemstodetach.pop())
 
+    ops.restore_full_images()
+    prefetch.stop()
+    materialize.stop(ops.get_dirty_paths())
+    container.close_all()
+    editors.unsubscribe()
+
     RemoveProperty(ShaderNodeTexImage, attr="animtexturekey")
     del ShaderNodeTexImage.animtexturekey
     del ShaderNodeTexImage.animtexturekeynext
+    del ShaderNodeTexImage.animtextureproxy
 
     for cls in register_classes:
         unregister_class(cls)
@@ -0,0 +1,101 @@
+"""
+Bakes animtexture keys into native image user animation.
+
+The `frame_offset` of the image user is keyed, so Blender shows the right
+image of the sequence without the frame change handler. Baked files can
+be rendered with the addon disabled:
+
+    blender -b shot.blend --python-expr "import animtexture.bake; animtexture.bake.bake_all()" -a
+
+The image user uses a cyclic duration of 1 (see `ops.set_image_user`),
+so the offset is constant within a held key and every key needs a
+single constant point.
+
+Blender only loads loose image files. The operator writes packed and
+sparse keys as loose files first, without it nodes with such keys are
+not baked and reported.
+"""
+import os
+import bpy
+from typing import Callable, Dict, List, Optional, Tuple
+from . import core
+from . import keyframes
+from . import nodeindex
+
+
+def get_offset_datapath(node_name: str) -> str:
+    return 'nodes["' + node_name + '"].image_user.frame_offset'
+
+
+def offset_points(index: keyframes.KeyframeIndex) -> List[Tuple[int, int]]:
+    """Returns [(frame, frame_offset)] with one point per key."""
+    return [(frame, number - 1)
+        for frame, number in zip(index.frames, index.numbers)]
+
+
+def bake_entry(entry: nodeindex.AnimtextureNode) -> int:
+    """Keys the image user offset of an animtexture node. Returns the number of points."""
+    tree, node = entry.tree, entry.node
+    datapath = get_offset_datapath(node.name)
+    action = tree.animation_data.action
+    crv = action.fcurves.find(datapath)
+    if crv:
+        action.fcurves.remove(crv)
+    crv = action.fcurves.new(datapath)
+
+    points = offset_points(keyframes.get_index(entry.fcurve))
+    keyframes.write_keys(crv.keyframe_points, points)
+    crv.update()
+
+    node.image_user.frame_start = 1
+    node.image_user.frame_duration = 1
+    node.image_user.use_cyclic = True
+    node.image_user.use_auto_refresh = True
+    return len(points)
+
+
+def clear_entry(entry: nodeindex.AnimtextureNode):
+    """Removes the baked image user animation."""
+    action = entry.tree.animation_data.action
+    crv = action.fcurves.find(get_offset_datapath(entry.node.name))
+    if crv:
+        action.fcurves.remove(crv)
+
+
+def get_missing_files(entry: nodeindex.AnimtextureNode) -> List[str]:
+    """Returns the image files of the keys, which Blender can not load (e.g. packed or sparse keys)."""
+    filepath = bpy.path.abspath(entry.image.filepath)
+    dir, name, padding, ext = core.get_sequence_path_info(filepath)
+    files = [core.get_file_name(name, padding, ext, v)
+        for v in sorted(set(keyframes.get_index(entry.fcurve).numbers))]
+    # links of lazy keys to a packed template do not exist either
+    return [f for f in files if not os.path.exists(os.path.join(dir, f))]
+
+
+def bake_all(clear: bool = False,
+        write_files: Optional[Callable] = None) -> Tuple[int, Dict[str, List[str]]]:
+    """
+    Bakes (or clears) all animtexture nodes of the file.
+    Does not need an active object or context. `write_files(node, numbers)`
+    writes the loose files of packed and sparse keys before baking. Nodes
+    with missing files are not baked. Returns the number of baked nodes and
+    the missing files {node label => [file names]}.
+    """
+    entries = [e for e in nodeindex.build()
+        if e.image and e.image.source == 'SEQUENCE']
+    missing = {}
+    count = 0
+    for entry in entries:
+        if clear:
+            clear_entry(entry)
+            count += 1
+            continue
+        if write_files:
+            write_files(entry.node, set(keyframes.get_index(entry.fcurve).numbers))
+        files = get_missing_files(entry)
+        if files:
+            missing[entry.owner.name + ": " + entry.node.name] = files
+            continue
+        bake_entry(entry)
+        count += 1
+    return count, missing
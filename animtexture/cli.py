@@ -0,0 +1,163 @@
+"""
+Command line for batch jobs without Blender.
+
+Keyframes are read from and written to a json file: [[frame, image_number], ...]
+
+    python -m animtexture.cli import-dedup <first image> <directory> --keys keys.json
+    python -m animtexture.cli export <sequence image> <directory> --keys keys.json [--fill-gaps]
+    python -m animtexture.cli reorganize <sequence image> --keys keys.json
+    python -m animtexture.cli validate <sequence image> --keys keys.json
+
+The <sequence image> is any file path of the sequence, e.g. shot/AT_0000.png.
+`validate` prints a json report and exits with 1, if files are missing.
+`export` extracts the images of packed sequences, sparse keys have to be
+composed (exported) in Blender.
+"""
+import os
+import sys
+import json
+import argparse
+from typing import List, Tuple
+from . import core
+
+
+def read_keys(path: str) -> List[Tuple[int, int]]:
+    with open(path, "r") as f:
+        return [(int(frame), int(number)) for frame, number in json.load(f)]
+
+
+def write_keys(path: str, keys):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump([[frame, number] for frame, number in keys], f)
+    os.replace(tmp, path)
+
+
+def import_dedup(args) -> int:
+    os.makedirs(args.directory, exist_ok=True)
+    keys, count, has_template = core.import_sequence(
+        os.path.abspath(args.image), os.path.abspath(args.directory),
+        collapse=not args.no_collapse)
+    write_keys(args.keys, keys)
+    print("Imported", count, "images as", len(keys), "keys.")
+    if not has_template:
+        name = os.path.basename(args.image)
+        if core.create_template(os.path.join(os.path.abspath(args.directory), name)):
+            print("The sequence has no template, created a blank one.")
+        else:
+            print("The sequence has no template, insert it in Blender.")
+    return 0
+
+
+def export(args) -> int:
+    path = os.path.abspath(args.image)
+    dir, name, padding, ext = core.get_sequence_path_info(path)
+    keys = core.get_frame_keys(read_keys(args.keys), args.fill_gaps, args.start, args.end)
+    sparse, lazy = core.find_stored_keys(path, keys.values())
+    # sparse keys are composed from the decoded template, which needs Blender
+    composed = [core.get_file_name(name, padding, ext, v) for v in sorted(sparse)]
+    composed = [f for f in composed if not os.path.exists(os.path.join(dir, f))]
+    if composed:
+        for file in composed:
+            print("Sparse:", file)
+        print("Sparse keys can only be exported from Blender.")
+        return 1
+    # sequences without a template (see import-dedup) are exported without
+    include_template = not args.no_template and core.has_template(path)
+    if not args.no_template and not include_template:
+        print("The sequence has no template, it is not exported.")
+    files = core.get_export_files(keys, name, padding, ext, lazy,
+        include_template=include_template)
+    # packed images are written for the export and removed afterwards
+    extracted = core.extract_packed(path, set(files.values()))
+    os.makedirs(args.directory, exist_ok=True)
+    try:
+        missing, failed = core.export_sequence(dir, files,
+            os.path.abspath(args.directory), args.link_mode, not args.full)
+    finally:
+        for file in extracted:
+            os.remove(file)
+    for msg, files in [["Missing", missing], ["Failed", failed]]:
+        for file in sorted(files):
+            print(msg + ":", file)
+    return 1 if missing or failed else 0
+
+
+def reorganize(args) -> int:
+    keys = read_keys(args.keys)
+    image = os.path.abspath(args.image)
+    # an interrupted reorganize is finished first, its lookup is included
+    renumber = core.reorganize(image, [number for frame, number in keys])
+    write_keys(args.keys, [(frame, renumber[number]) for frame, number in keys])
+    print("Reorganized", len(renumber), "images.")
+    return 0
+
+
+def validate(args) -> int:
+    keys = read_keys(args.keys)
+    path = os.path.abspath(args.image)
+    numbers = [number for frame, number in keys]
+    sparse, lazy = core.find_stored_keys(path, numbers)
+    report = core.validate(path, numbers, sparse, lazy)
+    # a missing template is reported, but like import-dedup, not an error
+    dir, name, padding, ext = core.get_sequence_path_info(path)
+    template = core.get_template(name + "0" * padding + ext)
+    report["template"] = template not in report["missing"]
+    report["missing"] = [f for f in report["missing"] if f != template]
+    # only stored as tiles, `export` needs Blender to compose them
+    report["sparse"] = [f for f in (core.get_file_name(name, padding, ext, v) for v in sorted(sparse))
+        if not os.path.exists(os.path.join(dir, f))]
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 1 if report["missing"] or report["empty"] else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="animtexture",
+        description="Process animtexture sequences without Blender.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import-dedup",
+        help="Import an image sequence, keeping one image per distinct content.")
+    p.add_argument("image", help="First image of the sequence to import")
+    p.add_argument("directory", help="Working directory of the animtexture sequence")
+    p.add_argument("--keys", required=True, help="Json file, the keyframes are written to")
+    p.add_argument("--no-collapse", action="store_true",
+        help="Only merge adjacent duplicates (A B A => 0 1 2)")
+    p.set_defaults(run=import_dedup)
+
+    p = commands.add_parser("export", help="Export the keys as an image sequence.")
+    p.add_argument("image", help="Any image of the animtexture sequence")
+    p.add_argument("directory", help="Export directory")
+    p.add_argument("--keys", required=True, help="Json file of the keyframes")
+    p.add_argument("--fill-gaps", action="store_true", help="Write an image for every frame")
+    p.add_argument("--start", type=int, help="First frame, when filling gaps")
+    p.add_argument("--end", type=int, help="Last frame, when filling gaps")
+    p.add_argument("--no-template", action="store_true", help="Do not export the template")
+    p.add_argument("--link-mode", default="COPY",
+        choices=["COPY", "AUTO", "REFLINK", "HARDLINK", "SYMLINK"],
+        help="How held frames are written")
+    p.add_argument("--full", action="store_true",
+        help="Write all files, even if they did not change since the last export")
+    p.set_defaults(run=export)
+
+    p = commands.add_parser("reorganize",
+        help="Remove unused images and number the images consecutively.")
+    p.add_argument("image", help="Any image of the animtexture sequence")
+    p.add_argument("--keys", required=True, help="Json file of the keyframes, it is updated")
+    p.set_defaults(run=reorganize)
+
+    p = commands.add_parser("validate", help="Report missing and empty images.")
+    p.add_argument("image", help="Any image of the animtexture sequence")
+    p.add_argument("--keys", required=True, help="Json file of the keyframes")
+    p.set_defaults(run=validate)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = get_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
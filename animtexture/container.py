@@ -0,0 +1,271 @@
+"""
+Single-file container of the key images of a sequence.
+
+Thousands of small numbered files are slow on network shares and in
+backup tools. A container stores the encoded image files in one file:
+
+    header  "ATC1", table offset (u64), table size (u64)
+    chunks  the image files, back to back
+    table   count (u32), then per entry: name length (u16), name,
+            offset (u64), size (u64)
+
+Updates append the new chunks and a new table and rewrite the header
+last, so an interrupted update leaves the previous state readable. The
+space of replaced chunks is reclaimed by `compact`. Reads are memory
+mapped. Does not depend on bpy.
+"""
+import os
+import mmap
+import struct
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"ATC1"
+EXT = ".atc"
+HEADER = struct.Struct("<4sQQ")
+ENTRY = struct.Struct("<QQ")
+# compact, when more than this part of the file is unused
+MAX_GARBAGE_RATIO = 0.5
+COPY_BUFFER = 2**20
+
+
+def get_container_name(name: str) -> str:
+    """Returns the container file name of the sequence `name` (without number)."""
+    return name + "container" + EXT
+
+
+class Container():
+    """Container file at `path`: {name => (offset, size)}."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Dict[str, Tuple[int, int]] = {}
+        # offset of the current table, changes with every update
+        self.table_offset = 0
+        self.stamp = None
+        self._file = None
+        self._mmap = None
+        if os.path.exists(path):
+            self.read_table()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def _get_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_size, st.st_mtime_ns)
+
+    def read_table(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            magic, offset, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("Not an animtexture container: " + self.path)
+            f.seek(offset)
+            table = f.read(size)
+        entries = {}
+        count, = struct.unpack_from("<I", table, 0)
+        pos = 4
+        for i in range(count):
+            length, = struct.unpack_from("<H", table, pos)
+            pos += 2
+            name = table[pos:pos + length].decode("utf-8")
+            pos += length
+            entries[name] = ENTRY.unpack_from(table, pos)
+            pos += ENTRY.size
+        self.entries = entries
+        self.table_offset = offset
+        self.stamp = self._get_stamp()
+
+    def is_stale(self) -> bool:
+        """True, if the file was changed by someone else."""
+        try:
+            return self._get_stamp() != self.stamp
+        except OSError:
+            return True
+
+    def _map(self) -> mmap.mmap:
+        if self._mmap is None:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, name: str) -> bytes:
+        offset, size = self.entries[name]
+        return self._map()[offset:offset + size]
+
+    def extract(self, name: str, path: str):
+        """Writes the file `name` to `path` (atomically)."""
+        offset, size = self.entries[name]
+        view = memoryview(self._map())
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(view[offset:offset + size])
+            os.replace(tmp, path)
+        finally:
+            view.release()
+
+    def _pack_table(self, entries: Dict[str, Tuple[int, int]]) -> bytes:
+        parts = [struct.pack("<I", len(entries))]
+        for name, (offset, size) in entries.items():
+            encoded = name.encode("utf-8")
+            parts.append(struct.pack("<H", len(encoded)) + encoded
+                + ENTRY.pack(offset, size))
+        return b"".join(parts)
+
+    def _commit(self, f, entries: Dict[str, Tuple[int, int]]):
+        """Appends the table of `entries` to the open file and switches the header to it."""
+        table = self._pack_table(entries)
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        f.write(table)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(table)))
+        f.flush()
+        os.fsync(f.fileno())
+        self.entries = entries
+        self.table_offset = offset
+
+    def _open_for_update(self):
+        self.close()
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, HEADER.size, 0))
+                f.write(struct.pack("<I", 0))
+        return open(self.path, "r+b")
+
+    def put(self, items: Dict[str, bytes]):
+        """Adds or replaces files: {name => content}."""
+        if not items:
+            return
+        entries = dict(self.entries)
+        with self._open_for_update() as f:
+            f.seek(0, os.SEEK_END)
+            for name, data in items.items():
+                entries[name] = (f.tell(), len(data))
+                f.write(data)
+            self._commit(f, entries)
+        self.stamp = self._get_stamp()
+        if self.garbage() > MAX_GARBAGE_RATIO * os.path.getsize(self.path):
+            self.compact()
+
+    def put_files(self, paths: Iterable[str]):
+        """Adds or replaces files by their base name. The files are streamed one at a time."""
+        paths = list(paths)
+        if not paths:
+            return
+        entries = dict(self.entries)
+        with self._open_for_update() as f:
+            f.seek(0, os.SEEK_END)
+            for path in paths:
+                offset = f.tell()
+                with open(path, "rb") as src:
+                    shutil.copyfileobj(src, f, COPY_BUFFER)
+                entries[os.path.basename(path)] = (offset, f.tell() - offset)
+            self._commit(f, entries)
+        self.stamp = self._get_stamp()
+        if self.garbage() > MAX_GARBAGE_RATIO * os.path.getsize(self.path):
+            self.compact()
+
+    def rename(self, mapping: Dict[str, str]):
+        """
+        Renames entries in a single table update. Entries, which are not
+        in `mapping`, are removed.
+        """
+        entries = {mapping[n]: e for n, e in self.entries.items() if n in mapping}
+        with self._open_for_update() as f:
+            self._commit(f, entries)
+        self.stamp = self._get_stamp()
+
+    def remove(self, names: Iterable[str]):
+        names = set(names)
+        self.rename({n: n for n in self.entries if n not in names})
+
+    def garbage(self) -> int:
+        """Bytes of the file, which belong to no entry."""
+        used = sum(size for offset, size in self.entries.values())
+        return os.path.getsize(self.path) - HEADER.size - used
+
+    def compact(self):
+        """Rewrites the container without unused space."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, 0, 0))
+            entries = {}
+            view = memoryview(self._map())
+            try:
+                for name, (offset, size) in self.entries.items():
+                    entries[name] = (f.tell(), size)
+                    f.write(view[offset:offset + size])
+            finally:
+                view.release()
+        self.close()
+        with open(tmp, "r+b") as f:
+            self._commit(f, entries)
+        os.replace(tmp, self.path)
+        self.stamp = self._get_stamp()
+
+
+_containers: Dict[str, Container] = {}
+
+
+def get_container(path: str) -> Optional[Container]:
+    """Returns the (cached) container at `path` or None, if there is none."""
+    c = _containers.get(path)
+    if c is None or c.is_stale():
+        if c:
+            c.close()
+        if not os.path.exists(path):
+            _containers.pop(path, None)
+            return None
+        c = _containers[path] = Container(path)
+    return c
+
+
+def pack(path: str, directory: str, names: Iterable[str]) -> Container:
+    """Creates (or replaces) the container at `path` with the files `names` of `directory`."""
+    tmp = path + ".new"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    c = Container(tmp)
+    c.put_files([os.path.join(directory, n) for n in names])
+    c.close()
+    os.replace(tmp, path)
+    return get_container(path)
+
+
+def unpack(path: str, directory: str, names: Optional[Iterable[str]] = None) -> List[str]:
+    """Writes the files of the container (or only `names`) to `directory`. Returns the paths."""
+    c = get_container(path)
+    if c is None:
+        return []
+    written = []
+    for name in c.names() if names is None else names:
+        if name in c:
+            target = os.path.join(directory, name)
+            c.extract(name, target)
+            written.append(target)
+    return written
+
+
+def close_all():
+    for c in _containers.values():
+        c.close()
+    _containers.clear()
@@ -0,0 +1,581 @@
+"""
+Sequence logic without Blender.
+
+Works on a plain list of keyframes [(frame, image_number)] and the files
+of a sequence directory: path parsing, import with deduplication, export
+with gap filling, reorganizing (renumbering) and validation. The Blender
+operators and the command line (`cli.py`) are built on these functions.
+"""
+import os
+import json
+import shutil
+import string
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from . import dedup
+from . import seqindex
+from . import fileops
+from . import container
+from . import tiles
+from . import encoder
+from . import materialize
+from .keyframes import KeyframeIndex
+
+
+def get_sequence_path_info(absfilepath: str) -> Tuple[str, str, int, str]:
+    """Returns: directory, name, padding, extension(with a leading dot)."""
+    dir = os.path.dirname(absfilepath)
+    name, ext = os.path.splitext(os.path.basename(absfilepath))
+    stripped_name = name.rstrip(string.digits)
+    return dir, stripped_name, len(name) - len(stripped_name), ext
+
+
+def get_template(path: str) -> str:
+    """Returns template name with extension."""
+    if "." not in path:
+        raise Exception("Path does not contain a file extension.")
+    ext = "." + path.split(".")[-1]
+    return path[:-len(ext)] + "template" + ext
+
+
+def get_file_name(name: str, padding: int, ext: str, number: int) -> str:
+    return name + str(number).zfill(padding) + ext
+
+
+def get_sequence_files(names: Iterable[str], name: str, padding: int, ext: str) -> List[str]:
+    """Returns the sorted file names, which belong to the sequence."""
+    length = len(name) + padding + len(ext)
+    return sorted(f for f in names
+        if f.startswith(name)
+            and len(f) == length
+            and f[len(name):len(name) + padding].isdigit()
+            and f.endswith(ext))
+
+
+def renumber(values: Iterable[int]) -> Dict[int, int]:
+    """
+    Returns a lookup, which numbers the image numbers consecutively in
+    the order of their first use: [10, 12, 10, 20] => {10: 0, 12: 1, 20: 2}
+    """
+    result = {}
+    for v in values:
+        if v not in result:
+            result[v] = len(result)
+    return result
+
+
+def import_sequence(import_filepath: str, directory: str,
+        collapse: bool = True) -> Tuple[List[Tuple[int, int]], int, bool]:
+    """
+    Copies one image per distinct content of the sequence, which starts at
+    `import_filepath`, into `directory`. A keyframe is created, whenever the
+    content changes. Returns the keyframes, the number of images and
+    whether a template was copied.
+    """
+    dir, name, padding, ext = get_sequence_path_info(import_filepath)
+    # the source directory may belong to someone else, its index is cached
+    src_index = seqindex.get_index(dir, sidecar=False)
+    src_index.refresh(rehash=False)
+
+    template_name = get_template(name + "0" * padding + ext)
+    has_template = template_name in src_index.entries
+    if has_template:
+        shutil.copyfile(os.path.join(dir, template_name),
+            os.path.join(directory, template_name))
+
+    # hash every file once (in parallel) and compare the digests.
+    # Unchanged files reuse the digest of the sidecar index.
+    files = get_sequence_files(src_index.names(), name, padding, ext)
+    files = files[files.index(os.path.basename(import_filepath)):]
+    src_index.hash_missing(files)
+    src_index.write()
+    index_start, index_end = len(name), len(name) + padding
+    frames = [(int(f[index_start:index_end]), os.path.join(dir, f)) for f in files]
+    digests = {os.path.join(dir, f): src_index.digest(f) for f in files}
+    keys, sources = dedup.find_keys(frames, digests, collapse=collapse)
+
+    dst_index = seqindex.get_index(directory)
+    for i, source in enumerate(sources):
+        target = get_file_name(name, padding, ext, i)
+        fileops.copy_fresh(source, os.path.join(directory, target))
+        dst_index.update(target, digests[source])
+    if has_template:
+        dst_index.update(template_name)
+    dst_index.write()
+    return keys, len(sources), has_template
+
+
+def create_template(absfilepath: str) -> bool:
+    """
+    Creates a blank (transparent) template with the size of the first image
+    of the sequence, if there is none. Only PNG sequences can be written
+    without Blender. Returns whether the template exists.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    template = os.path.join(dir, get_template(name + "0" * padding + ext))
+    if os.path.exists(template):
+        return True
+    size = encoder.png_size(os.path.join(dir, get_file_name(name, padding, ext, 0)))
+    if size is None:
+        return False
+    width, height = size
+    encoder.atomic_write(template, encoder.encode_png(width, height, 4,
+        np.zeros(width * height * 4, dtype=np.float32)))
+    seqindex.record_files(dir, [os.path.basename(template)])
+    return True
+
+
+def get_export_files(keys: Dict[int, int], name: str, padding: int, ext: str,
+        lazy: Iterable[int] = (), include_template: bool = True) -> Dict[str, str]:
+    """
+    Returns {target: source} file names for the export of {frame => image_number}.
+    Lazy keys are exported from the template.
+    """
+    template_name = get_template(name + "0" * padding + ext)
+    lazy = set(lazy)
+    files = {get_file_name(name, padding, ext, frame):
+                template_name if image_number in lazy else
+                get_file_name(name, padding, ext, image_number)
+                for frame, image_number in keys.items()
+            }
+    if include_template:
+        files[template_name] = template_name
+    return files
+
+
+def find_stored_keys(absfilepath: str, key_values: Iterable[int]) -> Tuple[Set[int], Set[int]]:
+    """
+    Returns the sparse and the lazy keys of a sequence from its files, for
+    callers without the node properties (the command line). Sparse keys
+    have a sparse file, lazy keys are links to the template.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    template_name = get_template(name + "0" * padding + ext)
+    template = os.path.join(dir, template_name)
+    sparse, lazy = set(), set()
+    for v in set(key_values):
+        file = get_file_name(name, padding, ext, v)
+        path = os.path.join(dir, file)
+        if os.path.exists(tiles.get_sparse_path(dir, file)):
+            sparse.add(v)
+        elif os.path.islink(path):
+            # the template of packed sequences is not a loose file
+            if os.path.basename(os.readlink(path)) == template_name:
+                lazy.add(v)
+        elif os.path.exists(path) and os.path.exists(template) and os.path.samefile(path, template):
+            lazy.add(v)
+    return sparse, lazy
+
+
+def has_template(absfilepath: str) -> bool:
+    """True, if the template is a loose file or packed."""
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    template_name = get_template(name + "0" * padding + ext)
+    if os.path.exists(os.path.join(dir, template_name)):
+        return True
+    packed = container.get_container(os.path.join(dir, container.get_container_name(name)))
+    return bool(packed) and template_name in packed
+
+
+def extract_packed(absfilepath: str, names: Iterable[str]) -> List[str]:
+    """
+    Writes the files `names`, which are only stored in the container of a
+    packed sequence, as loose files. Returns the written paths, the caller
+    removes them again.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    packed = container.get_container(os.path.join(dir, container.get_container_name(name)))
+    if not packed:
+        return []
+    return materialize.extract_packed(packed, dir, names)
+
+
+def export_sequence(dir: str, files: Dict[str, str], directory: str,
+        link_mode: str = 'COPY', incremental: bool = True) -> Tuple[Set[str], Set[str]]:
+    """
+    Exports {target: source} from `dir` into `directory`. Every distinct
+    image is copied once, held frames are linked to that copy (or copied,
+    if linking is not possible). Targets, which are unchanged since the
+    last export, are skipped. Returns the missing and the failed files.
+    """
+    src_index = seqindex.get_index(dir)
+    src_index.refresh(rehash=False)
+    src_index.hash_missing(set(files.values()))
+    src_index.write()
+
+    manifest = fileops.ExportManifest(directory)
+    if not incremental:
+        manifest.entries = {}
+    exported = {}
+    copies = []
+    links = []
+    done = {}
+    missing_files = set()
+    failed_files = set()
+    for file_target, file_source in files.items():
+        digest = src_index.digest(file_source)
+        if digest is None:
+            missing_files.add(file_source)
+            continue
+        path_export = os.path.join(directory, file_target)
+        if file_source in exported:
+            todo = links
+            pair = (exported[file_source], path_export)
+        else:
+            todo = copies
+            pair = (os.path.join(dir, file_source), path_export)
+            exported[file_source] = path_export
+        if manifest.is_current(file_target, digest):
+            continue
+        todo.append(pair)
+        done[path_export] = (file_target, digest)
+
+    def fail(path_in, path_export):
+        failed_files.add(os.path.basename(path_in) + " > " + os.path.basename(path_export))
+        del done[path_export]
+
+    failed_exports = set()
+    for path_in, path_export, e in fileops.copy_files(copies):
+        fail(path_in, path_export)
+        failed_exports.add(path_export)
+    # held frames of a failed copy have nothing to link to
+    for path_in, path_export in [l for l in links if l[0] in failed_exports]:
+        fail(path_in, path_export)
+        fileops.remove_existing(path_export)
+    links = [l for l in links if l[0] not in failed_exports]
+
+    modes = fileops.link_modes_for(link_mode)
+    if not modes:
+        for path_in, path_export, e in fileops.copy_files(links):
+            fail(path_in, path_export)
+        links = []
+    linker = fileops.Linker(modes)
+    for path_in, path_export in links:
+        try:
+            linker.link(path_in, path_export)
+        except OSError as e:
+            fail(path_in, path_export)
+
+    manifest.entries = {t: e for t, e in manifest.entries.items()
+        if t in files}
+    for file_target, digest in done.values():
+        manifest.update(file_target, digest)
+    try:
+        manifest.write()
+    except OSError as e:
+        print("animtexture: Could not write export manifest.", e)
+    return missing_files, failed_files
+
+
+JOURNAL_NAME = ".animtexture_journal.json"
+STAGING_NAME = ".animtexture_staging"
+JOURNAL_VERSION = 1
+
+
+def plan_reorganize(absfilepath: str, key_values: List[int],
+        sparse: Iterable[int] = ()) -> dict:
+    """
+    Computes the journal of a reorganize: the renumber lookup, the moves
+    [(source, target)] of the images and their sparse copies, the files
+    to remove and the renaming of the container. Paths are relative to
+    the sequence directory. Does not change any file.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    template_name = get_template(name + "0" * padding + ext)
+    container_name = container.get_container_name(name)
+    def file_name(i):
+        return get_file_name(name, padding, ext, i)
+    def sparse_name(i):
+        return os.path.relpath(tiles.get_sparse_path(dir, file_name(i)), dir)
+
+    lookup = renumber(key_values)
+    index = seqindex.get_index(dir)
+    index.refresh(rehash=False)
+    existing = set(index.names())
+    required = {file_name(v) for v in lookup}
+    required.update([template_name, container_name])
+    removals = [f for f in existing if f not in required]
+
+    # sparse copies of unused keys
+    for v in set(sparse).difference(lookup):
+        if os.path.exists(os.path.join(dir, sparse_name(v))):
+            removals.append(sparse_name(v))
+
+    moves = []
+    for v, n in lookup.items():
+        if v == n:
+            continue
+        if file_name(v) in existing:
+            moves.append((file_name(v), file_name(n)))
+        if os.path.exists(os.path.join(dir, sparse_name(v))):
+            moves.append((sparse_name(v), sparse_name(n)))
+
+    # the packed images are renamed in a single table update
+    packed = container.get_container(os.path.join(dir, container_name))
+    packed_mapping = None
+    if packed:
+        packed_mapping = {file_name(v): file_name(n) for v, n in lookup.items()}
+        packed_mapping[template_name] = template_name
+
+    return {
+        "version": JOURNAL_VERSION,
+        "state": "planned",
+        # several sequences can share a directory, the lookup only applies to this one
+        "sequence": [name, padding, ext],
+        "keys": list(key_values),
+        "lookup": [[v, n] for v, n in lookup.items()],
+        "moves": moves,
+        "removals": removals,
+        "container": packed and {
+            "name": container_name,
+            "table_offset": packed.table_offset,
+            "mapping": packed_mapping,
+        },
+    }
+
+
+def get_journal_path(dir: str) -> str:
+    return os.path.join(dir, JOURNAL_NAME)
+
+
+def write_journal(dir: str, journal: dict):
+    """Writes the journal atomically and durably."""
+    path = get_journal_path(dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(journal, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_journal(dir: str) -> Optional[dict]:
+    try:
+        with open(get_journal_path(dir), "r") as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if journal.get("version") != JOURNAL_VERSION:
+        return None
+    return journal
+
+
+def _move(a: str, b: str):
+    if os.path.lexists(a):
+        os.makedirs(os.path.dirname(b), exist_ok=True)
+        os.rename(a, b)
+
+
+def stage(dir: str, journal: dict):
+    """Moves all sources and removed files into the staging directory."""
+    staging = os.path.join(dir, STAGING_NAME)
+    for source, target in journal["moves"]:
+        _move(os.path.join(dir, source), os.path.join(staging, "moved", target))
+    for file in journal["removals"]:
+        _move(os.path.join(dir, file), os.path.join(staging, "removed", file))
+
+
+def commit(dir: str, journal: dict):
+    """
+    Finishes a staged reorganize: renames the container entries, moves
+    the staged files to their targets and deletes the removed files.
+    Can be repeated after an interruption. The journal is kept as "done",
+    until the next reorganize, for keys which were saved before it.
+    """
+    if journal["state"] != "committed":
+        journal["state"] = "committed"
+        write_journal(dir, journal)
+    packed = journal["container"]
+    if packed:
+        c = container.get_container(os.path.join(dir, packed["name"]))
+        # the table moves with every update, an unchanged offset means
+        # that the rename has not been done yet
+        if c and c.table_offset == packed["table_offset"]:
+            c.rename(packed["mapping"])
+    staging = os.path.join(dir, STAGING_NAME)
+    for source, target in journal["moves"]:
+        _move(os.path.join(staging, "moved", target), os.path.join(dir, target))
+    shutil.rmtree(staging, ignore_errors=True)
+    journal["state"] = "done"
+    write_journal(dir, journal)
+
+
+def rollback(dir: str, journal: dict):
+    """Moves the staged files of an uncommitted reorganize back."""
+    staging = os.path.join(dir, STAGING_NAME)
+    for source, target in journal["moves"]:
+        _move(os.path.join(staging, "moved", target), os.path.join(dir, source))
+    for file in journal["removals"]:
+        _move(os.path.join(staging, "removed", file), os.path.join(dir, file))
+    shutil.rmtree(staging, ignore_errors=True)
+    os.remove(get_journal_path(dir))
+
+
+def recover(dir: str) -> Optional[dict]:
+    """
+    Completes or reverts an interrupted reorganize of `dir`. Returns the
+    journal of the last completed reorganize, keys which still use the
+    old numbers are renumbered with `get_lookup`.
+    """
+    journal = read_journal(dir)
+    if journal is None or journal["state"] == "done":
+        return journal
+    seqindex.get_index(dir).refresh(rehash=False)
+    if journal["state"] == "committed":
+        commit(dir, journal)
+        return journal
+    rollback(dir, journal)
+    return None
+
+
+def get_lookup(journal: dict, absfilepath: str,
+        key_values: List[int]) -> Optional[Dict[int, int]]:
+    """
+    Returns the renumber lookup of a journal, if it belongs to the sequence
+    of `absfilepath` and its keys are still numbered the old way.
+    """
+    sequence = list(get_sequence_path_info(absfilepath)[1:])
+    if journal.get("sequence") != sequence or list(key_values) != journal["keys"]:
+        return None
+    return {v: n for v, n in journal["lookup"]}
+
+
+def reorganize(absfilepath: str, key_values: List[int],
+        sparse: Iterable[int] = ()) -> Dict[int, int]:
+    """
+    Removes all files except for the required images from the sequence
+    directory. Renames the remaining images (and their sparse and packed
+    copies) consecutively (0, 1, 2, ...). Returns the renumber lookup,
+    the caller changes the keyframes to match.
+
+    The files are moved through a staging directory, a journal records
+    every step, so that `recover` can revert or complete an interrupted
+    reorganize. Keys which still use the numbers of an interrupted
+    reorganize are renumbered by it first, the returned lookup covers both.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    previous = recover(dir)
+    previous = previous and get_lookup(previous, absfilepath, key_values)
+    if previous:
+        key_values = [previous[v] for v in key_values]
+        sparse = [previous[v] for v in sparse if v in previous]
+
+    journal = plan_reorganize(absfilepath, key_values, sparse)
+    write_journal(dir, journal)
+    try:
+        stage(dir, journal)
+    except OSError:
+        rollback(dir, journal)
+        raise
+    commit(dir, journal)
+
+    index = seqindex.get_index(dir)
+    for file in journal["removals"]:
+        index.remove(file)
+    moved = [(s, t) for s, t in journal["moves"] if s in index.entries]
+    entries = [index.entries.pop(s) for s, t in moved]
+    for (s, t), entry in zip(moved, entries):
+        index.entries[t] = entry
+    index.modified = True
+    index.write()
+    lookup = {v: n for v, n in journal["lookup"]}
+    if previous:
+        return {v: lookup[p] for v, p in previous.items()}
+    return lookup
+
+
+def scan_directory(dir: str) -> Dict[str, int]:
+    """
+    Lists a sequence directory (and its sparse directory) with a single
+    scan each. Returns {file name => size}, sparse files as "sparse/<name>".
+    """
+    sizes = {}
+    for prefix in ["", tiles.SPARSE_DIR]:
+        try:
+            with os.scandir(os.path.join(dir, prefix)) as it:
+                for entry in it:
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        size = 0
+                    sizes[os.path.join(prefix, entry.name) if prefix else entry.name] = size
+        except OSError:
+            pass
+    return sizes
+
+
+def check_sequence(absfilepath: str, key_values: Iterable[int],
+        sparse: Iterable[int] = (), lazy: Iterable[int] = (),
+        sizes: Optional[Dict[str, int]] = None) -> Dict[str, list]:
+    """
+    Checks, that every key has a non-empty image file (or a sparse or
+    packed copy) and that the template exists. Lazy keys only need the
+    template. `sizes` is the `scan_directory` of the sequence directory.
+    Returns {"missing": [file names], "empty": [file names]}.
+    """
+    dir, name, padding, ext = get_sequence_path_info(absfilepath)
+    if sizes is None:
+        sizes = scan_directory(dir)
+    container_name = container.get_container_name(name)
+    packed = set()
+    if container_name in sizes:
+        # not the cached container, checks may run in a background thread
+        try:
+            c = container.Container(os.path.join(dir, container_name))
+            packed = set(c.names())
+        except (OSError, ValueError, struct.error):
+            pass
+    sparse = set(sparse)
+
+    missing = []
+    empty = []
+    required = [(v, get_file_name(name, padding, ext, v))
+        for v in sorted(set(key_values).difference(lazy))]
+    required.append((None, get_template(name + "0" * padding + ext)))
+    for v, file in required:
+        if file in packed:
+            continue
+        if v in sparse and os.path.relpath(tiles.get_sparse_path(dir, file), dir) in sizes:
+            continue
+        size = sizes.get(file)
+        if size is None:
+            missing.append(file)
+        elif size == 0:
+            empty.append(file)
+    return {"missing": missing, "empty": empty}
+
+
+def validate(absfilepath: str, key_values: Iterable[int],
+        sparse: Iterable[int] = (), lazy: Iterable[int] = ()) -> Dict[str, list]:
+    """Checks a single sequence, see `check_sequence`."""
+    return check_sequence(absfilepath, key_values, sparse, lazy)
+
+
+def validate_all(sequences: Iterable[Tuple[str, Iterable[int], Iterable[int], Iterable[int]]],
+        workers: int = fileops.MAX_WORKERS) -> List[Dict[str, list]]:
+    """
+    Checks many sequences [(absfilepath, key_values, sparse, lazy)]. Each
+    directory is scanned once, the directories in parallel, which hides
+    the latency of network shares. Returns the reports in order.
+    """
+    sequences = list(sequences)
+    dirs = list({os.path.dirname(s[0]) for s in sequences})
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(dirs)))) as pool:
+        sizes = dict(zip(dirs, pool.map(scan_directory, dirs)))
+    return [check_sequence(path, key_values, sparse, lazy, sizes[os.path.dirname(path)])
+        for path, key_values, sparse, lazy in sequences]
+
+
+def get_frame_keys(keys: Iterable[Tuple[int, int]], fill_gaps: bool = False,
+        start: Optional[int] = None, end: Optional[int] = None) -> Dict[int, int]:
+    """Returns {frame => image_number} of the keyframes or (with `fill_gaps`) of every frame."""
+    index = KeyframeIndex(keys)
+    if not fill_gaps:
+        return index.keys()
+    if not len(index):
+        return {}
+    start = index.frames[0] if start is None else start
+    end = index.frames[-1] if end is None else end
+    return index.image_range(start, end)
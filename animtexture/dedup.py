@@ -0,0 +1,64 @@
+"""
+Content based duplicate detection for image sequences.
+
+Every file is streamed and hashed exactly once (in parallel), afterwards
+only digests are compared. Does not depend on bpy.
+"""
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+from . import stats
+
+CHUNK_SIZE = 1024 * 1024
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def hash_file(path: str) -> str:
+    """Returns the blake2b hex digest of the file at `path`."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        # hashlib releases the GIL for large buffers, so threads scale
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+        stats.add_bytes("read", f.tell())
+    return h.hexdigest()
+
+
+def hash_files(paths: Iterable[str], workers: int = MAX_WORKERS) -> Dict[str, str]:
+    """Hashes all files on a thread pool. Returns {path => digest}."""
+    paths = list(paths)
+    if len(paths) < 2:
+        return {p: hash_file(p) for p in paths}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(hash_file, paths)))
+
+
+def find_keys(frames: List[Tuple[int, str]],
+        digests: Dict[str, str],
+        collapse: bool = True) -> Tuple[List[Tuple[int, int]], List[str]]:
+    """
+    Reduces a sorted list of (frame, path) to keyframes.
+    A keyframe is created whenever the content differs from the previous
+    frame. With `collapse`, frames with identical content share one image
+    number, even if they are not adjacent (A B A => 0 1 0).
+    Returns the keyframes [(frame, image_number)] and the source path for
+    each image number.
+    """
+    keys = []
+    sources = []
+    numbers = {}
+    previous = None
+    for frame, path in frames:
+        digest = digests[path]
+        if digest == previous:
+            continue
+        previous = digest
+        if collapse and digest in numbers:
+            number = numbers[digest]
+        else:
+            number = len(sources)
+            numbers[digest] = number
+            sources.append(path)
+        keys.append((frame, number))
+    return keys, sources
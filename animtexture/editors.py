@@ -0,0 +1,73 @@
+"""
+Registry of the image editors, which display an image.
+
+Walking all areas of all screens on every frame change is slow in files
+with many workspaces. The registry is built once and invalidated by the
+message bus, when an image editor changes its image or an area or window
+changes its layout. Entries are stored as (screen, area index), screens
+are ID datablocks and raise a ReferenceError when they are removed.
+"""
+import bpy
+from typing import Dict, List, Optional, Tuple
+
+_registry: Optional[Dict[int, List[Tuple[bpy.types.Screen, int]]]] = None
+owner = object()
+# incremented on every invalidation, so that callers can detect new editors
+generation = 0
+
+
+def invalidate(*args):
+    global _registry, generation
+    _registry = None
+    generation += 1
+
+
+def build():
+    global _registry
+    _registry = {}
+    for screen in bpy.data.screens:
+        for i, area in enumerate(screen.areas):
+            if area.type != 'IMAGE_EDITOR':
+                continue
+            image = area.spaces.active.image
+            if image:
+                _registry.setdefault(image.as_pointer(), []).append((screen, i))
+
+
+def get_spaces(image) -> list:
+    """Returns the active spaces of all image editors showing `image`."""
+    if _registry is None:
+        build()
+    spaces = []
+    for screen, i in _registry.get(image.as_pointer(), []):
+        try:
+            areas = screen.areas
+            if i < len(areas) and areas[i].type == 'IMAGE_EDITOR':
+                space = areas[i].spaces.active
+                if space.image == image:
+                    spaces.append(space)
+                    continue
+        except ReferenceError:
+            pass
+        # the layout changed without a notification, rebuild next time
+        invalidate()
+    return spaces
+
+
+def subscribe():
+    """Subscribes to layout changes. Has to be repeated after loading a file."""
+    bpy.msgbus.clear_by_owner(owner)
+    for key in [
+            (bpy.types.SpaceImageEditor, "image"),
+            (bpy.types.Area, "type"),
+            (bpy.types.Area, "ui_type"),
+            (bpy.types.Window, "screen"),
+            (bpy.types.Window, "workspace"),
+            ]:
+        bpy.msgbus.subscribe_rna(key=key, owner=owner, args=(), notify=invalidate)
+    invalidate()
+
+
+def unsubscribe():
+    bpy.msgbus.clear_by_owner(owner)
+    invalidate()
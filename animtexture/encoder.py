@@ -0,0 +1,147 @@
+"""
+Background encoding of image sequence frames.
+
+Pixel buffers are copied out of Blender on the main thread, encoded on a
+thread pool and moved into place atomically. Only 8 bit PNG can be
+encoded without Blender, other formats have to be saved by Blender.
+Does not depend on bpy.
+"""
+import os
+import zlib
+import struct
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Optional, Tuple
+
+MAX_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+# memory of the pixel snapshots, older snapshots are dropped (and saved by Blender)
+MAX_SNAPSHOT_BYTES = 2**30
+
+
+class EncodeJob():
+    """A snapshot of the pixels of one frame, which is written to `path`."""
+
+    def __init__(self, path: str, width: int, height: int, channels: int,
+            pixels: np.ndarray) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.pixels = pixels
+
+
+def png_chunk(tag: bytes, data: bytes) -> bytes:
+    return (struct.pack(">I", len(data)) + tag + data
+        + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+def encode_png(width: int, height: int, channels: int, pixels: np.ndarray,
+        compression: int = 6) -> bytes:
+    """
+    Encodes float pixels (0..1, rows bottom to top, like Image.pixels)
+    as an 8 bit PNG. zlib releases the GIL, so this scales on threads.
+    """
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    rows = np.clip(pixels.reshape(height, width * channels), 0.0, 1.0)
+    rows = (rows[::-1] * 255.0 + 0.5).astype(np.uint8)
+    # filter type 0 (None) in front of every row
+    raw = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 1:] = rows
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compression))
+        + png_chunk(b"IEND", b""))
+
+def png_size(path: str) -> Optional[Tuple[int, int]]:
+    """Returns width and height of a PNG file from its header or None."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+def atomic_write(path: str, data: bytes):
+    """Writes to a temporary file and renames it into place."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    # replaces links (lazy keys) instead of writing through them
+    os.replace(tmp, path)
+
+def run_job(job: EncodeJob) -> str:
+    atomic_write(job.path,
+        encode_png(job.width, job.height, job.channels, job.pixels))
+    return job.path
+
+
+class AsyncEncoder():
+    """Encodes and writes jobs on a thread pool and reports the progress."""
+
+    def __init__(self, workers: int = MAX_WORKERS) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures: List[Future] = []
+
+    def submit(self, jobs: List[EncodeJob]):
+        self.futures += [self.pool.submit(run_job, job) for job in jobs]
+
+    def progress(self) -> Tuple[int, int]:
+        """Returns (finished, total)."""
+        return sum(f.done() for f in self.futures), len(self.futures)
+
+    def done(self) -> bool:
+        return all(f.done() for f in self.futures)
+
+    def results(self) -> Tuple[List[str], List[str]]:
+        """Returns the written paths and the error messages."""
+        written, errors = [], []
+        for f in self.futures:
+            if f.cancelled():
+                continue
+            e = f.exception()
+            if e:
+                errors.append(str(e))
+            else:
+                written.append(f.result())
+        return written, errors
+
+    def cancel(self):
+        for f in self.futures:
+            f.cancel()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+# snapshots of painted keys: {(image name, image number) => EncodeJob}, oldest first
+snapshots: 'OrderedDict[Tuple[str, int], EncodeJob]' = OrderedDict()
+
+def snapshot_bytes() -> int:
+    return sum(job.pixels.nbytes for job in snapshots.values())
+
+def add_snapshot(key: Tuple[str, int], job: EncodeJob, budget: int = MAX_SNAPSHOT_BYTES):
+    """Stores a snapshot, drops the oldest ones to stay within `budget` bytes."""
+    snapshots.pop(key, None)
+    snapshots[key] = job
+    size = snapshot_bytes()
+    while size > budget and len(snapshots) > 1:
+        _, dropped = snapshots.popitem(last=False)
+        size -= dropped.pixels.nbytes
+
+def take_snapshot(image, number: int, path: str) -> Optional[EncodeJob]:
+    """
+    Copies the pixels of the displayed frame of a bpy image, if it can be
+    encoded in the background (8 bit PNG).
+    """
+    if image.file_format != 'PNG' or image.is_float:
+        return None
+    width, height = image.size
+    channels = image.channels
+    pixels = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    job = EncodeJob(path, width, height, channels, pixels)
+    add_snapshot((image.name, number), job)
+    return job
@@ -0,0 +1,190 @@
+"""
+File operations used for exporting sequences: copies, hardlinks, reflinks
+(copy-on-write clones), symlinks and the export manifest.
+Does not depend on bpy.
+"""
+import os
+import sys
+import json
+import errno
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set, Tuple
+from . import stats
+
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# ioctl request for a copy-on-write clone on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+LINK_MODES = ('REFLINK', 'HARDLINK', 'SYMLINK')
+
+# errors, which mean that a link mode is not supported by the file system
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.EMLINK, errno.EINVAL, errno.ENOTTY, errno.ENOSYS}
+
+
+def reflink(src: str, dst: str):
+    """Creates a copy-on-write clone of `src`. Raises OSError if unsupported."""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on " + sys.platform)
+    import fcntl
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+def hardlink(src: str, dst: str):
+    os.link(src, dst)
+
+def symlink(src: str, dst: str):
+    """Creates a relative symlink, so the target directory stays movable."""
+    os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+
+LINK_FUNCTIONS = {
+    'REFLINK': reflink,
+    'HARDLINK': hardlink,
+    'SYMLINK': symlink,
+    }
+
+
+def remove_existing(path: str):
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+class Linker():
+    """
+    Links files with the first working mode of `modes` and falls back to
+    copying. Modes which turned out to be unsupported are not tried again,
+    errors of a single file are raised.
+    """
+
+    def __init__(self, modes: Iterable[str]) -> None:
+        self.modes = [m for m in modes if m in LINK_FUNCTIONS]
+        self.failed: Set[str] = set()
+        self.used: Dict[str, int] = {}
+
+    def link(self, src: str, dst: str) -> str:
+        """Links or copies `src` to `dst`. Returns the mode which was used."""
+        remove_existing(dst)
+        for mode in self.modes:
+            if mode in self.failed:
+                continue
+            try:
+                LINK_FUNCTIONS[mode](src, dst)
+            except NotImplementedError:
+                self.failed.add(mode)
+                continue
+            except OSError as e:
+                remove_existing(dst)
+                # errors of the file itself (e.g. a missing source) are not
+                # a reason to give up the mode for all other files
+                if e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                self.failed.add(mode)
+                continue
+            self.used[mode] = self.used.get(mode, 0) + 1
+            return mode
+        shutil.copyfile(src, dst)
+        self.used['COPY'] = self.used.get('COPY', 0) + 1
+        return 'COPY'
+
+
+def link_modes_for(mode: str) -> list:
+    """Returns the link modes to try for an export mode, preferred first."""
+    if mode == 'COPY':
+        return []
+    if mode == 'AUTO':
+        return list(LINK_MODES)
+    return [mode] + [m for m in LINK_MODES if m != mode]
+
+
+MANIFEST_NAME = ".animtexture_export.json"
+MANIFEST_VERSION = 1
+
+
+class ExportManifest():
+    """
+    Manifest of an export directory: {target => [source digest, size, mtime_ns]}.
+    A target is up to date, if the digest of its source did not change and
+    the file was not touched since the last export.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.entries: Dict[str, list] = {}
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data["files"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def is_current(self, target: str, digest: str) -> bool:
+        entry = self.entries.get(target)
+        if not entry or entry[0] != digest:
+            return False
+        try:
+            st = os.stat(os.path.join(self.directory, target))
+        except OSError:
+            return False
+        return entry[1] == st.st_size and entry[2] == st.st_mtime_ns
+
+    def update(self, target: str, digest: str):
+        st = os.stat(os.path.join(self.directory, target))
+        self.entries[target] = [digest, st.st_size, st.st_mtime_ns]
+
+    def write(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.entries}, f)
+        os.replace(tmp, self.path)
+
+
+def copy_fresh(src: str, dst: str):
+    """Copies `src` to `dst`. Never writes through an existing link at `dst`."""
+    remove_existing(dst)
+    shutil.copyfile(src, dst)
+    if stats.enabled:
+        stats.add_bytes("copied", os.path.getsize(dst))
+
+
+def copy_files(pairs: List[Tuple[str, str]],
+        workers: int = MAX_WORKERS) -> List[Tuple[str, str, OSError]]:
+    """Copies [(src, dst)] on a thread pool. Returns the failed copies."""
+    def copy(pair):
+        try:
+            copy_fresh(*pair)
+        except OSError as e:
+            return pair[0], pair[1], e
+        return None
+    if len(pairs) < 2:
+        results = [copy(p) for p in pairs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(copy, pairs))
+    return [r for r in results if r]
+
+
+def link_lazy(template: str, dst: str) -> bool:
+    """
+    Links `dst` to the template, without copying its content. The template
+    is made read-only, so saving into a hardlink or symlink fails instead
+    of overwriting the template. Returns False, if a copy had to be made.
+    """
+    # read-only protection of links only works on posix systems
+    modes = LINK_MODES if os.name == 'posix' else ('REFLINK',)
+    mode = Linker(modes).link(template, dst)
+    if mode in ('HARDLINK', 'SYMLINK'):
+        st = os.stat(template)
+        os.chmod(template, st.st_mode & ~0o222)
+    return mode != 'COPY'
@@ -0,0 +1,169 @@
+"""
+Sorted lookup of animtexture keyframes: frame => image number.
+
+The animtexture F-curves use CONSTANT interpolation, so the image number
+of a frame is the value of the last keyframe at or before that frame.
+Frames before the first keyframe show the first image.
+"""
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class KeyframeIndex():
+    """Lookup of image numbers with O(log K) per frame."""
+
+    def __init__(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        # later keyframes on the same frame win, like F-curve evaluation
+        keys = dict(pairs)
+        self.frames: List[int] = sorted(keys)
+        self.numbers: List[int] = [keys[f] for f in self.frames]
+
+    @classmethod
+    def from_keyframe_points(cls, keyframe_points) -> 'KeyframeIndex':
+        co = [0.0] * (2 * len(keyframe_points))
+        keyframe_points.foreach_get("co", co)
+        return cls((int(co[i]), int(co[i + 1])) for i in range(0, len(co), 2))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def image_at(self, frame: int) -> Optional[int]:
+        """Returns the image number displayed at `frame`, None without keyframes."""
+        if not self.frames:
+            return None
+        i = bisect_right(self.frames, frame) - 1
+        return self.numbers[max(i, 0)]
+
+    def image_range(self, start: int, end: int) -> Dict[int, int]:
+        """Returns {frame => image_number} for all frames of [start, end]."""
+        result = {}
+        if not self.frames:
+            return result
+        i = max(bisect_right(self.frames, start) - 1, 0)
+        count = len(self.frames)
+        for frame in range(start, end + 1):
+            while i + 1 < count and self.frames[i + 1] <= frame:
+                i += 1
+            result[frame] = self.numbers[i]
+        return result
+
+    def upcoming(self, frame: int, count: int) -> List[int]:
+        """Returns the next `count` distinct image numbers after `frame`."""
+        result = []
+        current = self.image_at(frame)
+        i = bisect_right(self.frames, frame)
+        end = len(self.numbers)
+        while i < end and len(result) < count:
+            number = self.numbers[i]
+            if number != current and number not in result:
+                result.append(number)
+            i += 1
+        return result
+
+    def neighbours(self, frame: int) -> Tuple[Optional[int], Optional[int]]:
+        """Returns the image numbers of the keyframes before and after the key at `frame`."""
+        if not self.frames:
+            return None, None
+        i = max(bisect_right(self.frames, frame) - 1, 0)
+        previous = self.numbers[i - 1] if i > 0 else None
+        next = self.numbers[i + 1] if i + 1 < len(self.frames) else None
+        return previous, next
+
+    def keys(self) -> Dict[int, int]:
+        """Returns {frame => image_number} of the keyframes."""
+        return dict(zip(self.frames, self.numbers))
+
+
+# enum value of 'CONSTANT' in Keyframe.interpolation
+INTERPOLATION_CONSTANT = 0
+
+
+def clear_keys(keyframe_points):
+    """Removes all keyframe points."""
+    if hasattr(keyframe_points, "clear"):
+        keyframe_points.clear()
+        return
+    # removing from the back does not move the remaining points
+    while len(keyframe_points):
+        keyframe_points.remove(keyframe_points[-1], fast=True)
+
+
+def write_keys(keyframe_points, pairs: Iterable[Tuple[int, int]]):
+    """
+    Replaces all keyframe points with CONSTANT keys [(frame, value)].
+    The points are written as whole arrays with foreach_set.
+    """
+    co = [float(v) for pair in pairs for v in pair]
+    count = len(co) // 2
+    if len(keyframe_points) > count:
+        clear_keys(keyframe_points)
+    if len(keyframe_points) < count:
+        keyframe_points.add(count - len(keyframe_points))
+    if not count:
+        return
+    keyframe_points.foreach_set("co", co)
+    keyframe_points.foreach_set("handle_left", co)
+    keyframe_points.foreach_set("handle_right", co)
+    keyframe_points.foreach_set("interpolation", [INTERPOLATION_CONSTANT] * count)
+
+
+# inserts of up to this many keys use Keyframe insertion, more are added in bulk
+MAX_SINGLE_INSERTS = 8
+
+
+def insert_keys(fcurve, pairs: Iterable[Tuple[int, int]]):
+    """
+    Inserts CONSTANT keys [(frame, value)] into an F-curve. Keys on
+    existing frames replace their value. The existing points keep their
+    keyframe type and selection.
+    """
+    pairs = list(dict(pairs).items())
+    if not pairs:
+        return
+    keyframe_points = fcurve.keyframe_points
+    if len(pairs) <= MAX_SINGLE_INSERTS:
+        for frame, value in pairs:
+            point = keyframe_points.insert(frame, value, options={'REPLACE'})
+            point.interpolation = 'CONSTANT'
+    else:
+        count = len(keyframe_points)
+        co = [0.0] * (2 * count)
+        keyframe_points.foreach_get("co", co)
+        positions = {int(co[i]): i for i in range(0, len(co), 2)}
+        added = []
+        for frame, value in pairs:
+            i = positions.get(frame)
+            if i is None:
+                added += [float(frame), float(value)]
+            else:
+                co[i + 1] = float(value)
+        interpolation = [0] * count
+        keyframe_points.foreach_get("interpolation", interpolation)
+        keyframe_points.add(len(added) // 2)
+        co += added
+        keyframe_points.foreach_set("co", co)
+        keyframe_points.foreach_set("interpolation",
+            interpolation + [INTERPOLATION_CONSTANT] * (len(added) // 2))
+        # update() sorts the added points into place
+    fcurve.update()
+    invalidate(fcurve)
+
+
+_cache: Dict[int, Tuple[int, KeyframeIndex]] = {}
+
+def get_index(fcurve) -> KeyframeIndex:
+    """Returns the cached KeyframeIndex of an F-curve."""
+    key = fcurve.as_pointer()
+    count = len(fcurve.keyframe_points)
+    cached = _cache.get(key)
+    if cached is None or cached[0] != count:
+        cached = (count, KeyframeIndex.from_keyframe_points(fcurve.keyframe_points))
+        _cache[key] = cached
+    return cached[1]
+
+def invalidate(fcurve=None):
+    """Drops the cached index of `fcurve` (or of all F-curves)."""
+    if fcurve is None:
+        _cache.clear()
+    else:
+        _cache.pop(fcurve.as_pointer(), None)
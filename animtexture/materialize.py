@@ -0,0 +1,145 @@
+"""
+Loose image files of packed and sparse keys.
+
+Blender loads the frames of a sequence from numbered files, so packed
+(container) and sparse keys are written as loose files, before they are
+displayed. Sparse keys of upcoming frames are composed on a background
+thread. The written files are tracked and removed again, when they have
+not been displayed for a while, so the sequence keeps its compact
+storage. Does not depend on bpy.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from . import tiles
+from . import encoder
+
+MAX_WORKERS = 2
+# loose files, which are kept after they were displayed last
+MAX_LOOSE_FILES = 32
+
+
+class Materializer():
+    """Writes loose files in the background and tracks them: {path => None} in LRU order."""
+
+    def __init__(self, workers: int = MAX_WORKERS) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Future] = {}
+        self.written: 'OrderedDict[str, None]' = OrderedDict()
+
+    def record(self, paths: Iterable[str]):
+        """Tracks files, which were written on the main thread."""
+        with self.lock:
+            for path in paths:
+                self.written[path] = None
+                self.written.move_to_end(path)
+
+    def touch(self, path: str):
+        """Marks a tracked file as just displayed."""
+        with self.lock:
+            if path in self.written:
+                self.written.move_to_end(path)
+
+    def is_pending(self, path: str) -> bool:
+        with self.lock:
+            return path in self.pending
+
+    def compose_sparse(self, path: str, base: np.ndarray):
+        """Composes the sparse key of the image file `path` as 8 bit PNG in the background."""
+        with self.lock:
+            if path in self.pending:
+                return
+            self.pending[path] = self.pool.submit(self._compose_sparse, path, base)
+
+    def _compose_sparse(self, path: str, base: np.ndarray):
+        try:
+            if os.path.exists(path):
+                return
+            data = tiles.load_sparse(tiles.get_sparse_path(
+                os.path.dirname(path), os.path.basename(path)))
+            if data is None:
+                return
+            width, height, channels, tile = (int(v) for v in data["shape"])
+            encoder.atomic_write(path, encoder.encode_png(width, height, channels,
+                tiles.compose(base, data)))
+            self.record([path])
+        finally:
+            with self.lock:
+                self.pending.pop(path, None)
+
+    def wait(self, path: str):
+        """Waits until a pending file is written."""
+        with self.lock:
+            future = self.pending.get(path)
+        if future:
+            try:
+                future.result()
+            except Exception as e:
+                print("animtexture: Could not compose", path, e)
+
+    def release(self, keep: Iterable[str] = (), limit: int = MAX_LOOSE_FILES) -> List[str]:
+        """
+        Removes the least recently displayed files, until at most `limit`
+        files are left. Files in `keep` are not removed. Returns the removed paths.
+        """
+        keep = set(keep)
+        removed = []
+        with self.lock:
+            excess = len(self.written) - limit
+            for path in list(self.written):
+                if excess <= 0:
+                    break
+                if path in keep or path in self.pending:
+                    continue
+                del self.written[path]
+                excess -= 1
+                try:
+                    os.remove(path)
+                    removed.append(path)
+                except OSError:
+                    pass
+        return removed
+
+    def forget(self, paths: Iterable[str]):
+        """Stops tracking files, which are not recreatable any more (e.g. painted keys)."""
+        with self.lock:
+            for path in paths:
+                self.written.pop(path, None)
+
+    def stop(self):
+        self.pool.shutdown(wait=True)
+
+
+def extract_packed(packed, dir: str, names: Iterable[str]) -> List[str]:
+    """
+    Writes the files `names` of the container `packed`, which are not
+    loose files in `dir` yet. Returns the written paths.
+    """
+    written = []
+    for name in names:
+        path = os.path.join(dir, name)
+        if name in packed and not os.path.exists(path):
+            packed.extract(name, path)
+            written.append(path)
+    return written
+
+
+_materializer: Optional[Materializer] = None
+
+def get_materializer() -> Materializer:
+    global _materializer
+    if _materializer is None:
+        _materializer = Materializer()
+    return _materializer
+
+def stop(keep: Iterable[str] = ()):
+    """Waits for pending files and removes all tracked files (except `keep`)."""
+    global _materializer
+    if _materializer is not None:
+        _materializer.stop()
+        _materializer.release(keep, 0)
+        _materializer = None
@@ -0,0 +1,86 @@
+"""
+Index of all animtexture nodes of the file.
+
+Load and save handlers iterate this index instead of scanning every
+material and looking up the F-curve of every node. Covers the node trees
+of materials, worlds, lights and node groups. The index is rebuilt
+lazily, after the depsgraph or the message bus reported a change.
+"""
+import bpy
+from typing import List, Optional
+from bpy.types import FCurve, ID, Image, NodeTree, ShaderNodeTexImage
+
+ANIMKEY_SUFFIX = '.animtexturekey'
+UPDATE_TYPES = ['MATERIAL', 'NODETREE', 'ACTION', 'WORLD', 'LIGHT']
+
+
+class AnimtextureNode():
+    """An animtexture node and its keyframe F-curve."""
+    def __init__(self,
+            owner: ID,
+            tree: NodeTree,
+            node: ShaderNodeTexImage,
+            fcurve: FCurve) -> None:
+        self.owner = owner
+        self.tree = tree
+        self.node = node
+        self.fcurve = fcurve
+
+    @property
+    def image(self) -> Image:
+        return self.node.image
+
+    @property
+    def keyframes(self):
+        return self.fcurve.keyframe_points
+
+
+_entries: Optional[List[AnimtextureNode]] = None
+
+
+def iter_node_trees():
+    """Yields (owner, node_tree) of all shader node trees of the file."""
+    for collection in [bpy.data.materials, bpy.data.worlds, bpy.data.lights]:
+        for owner in collection:
+            if owner.use_nodes and owner.node_tree:
+                yield owner, owner.node_tree
+    for group in bpy.data.node_groups:
+        if group.type == 'SHADER':
+            yield group, group
+
+
+def build() -> List[AnimtextureNode]:
+    global _entries
+    _entries = []
+    for owner, tree in iter_node_trees():
+        if not tree.animation_data or not tree.animation_data.action:
+            continue
+        # one pass over the F-curves instead of fcurves.find per node
+        curves = {fc.data_path: fc for fc in tree.animation_data.action.fcurves
+            if fc.data_path.endswith(ANIMKEY_SUFFIX) and len(fc.keyframe_points)}
+        if not curves:
+            continue
+        for node in tree.nodes:
+            if node.type != 'TEX_IMAGE':
+                continue
+            fc = curves.get('nodes["' + node.name + '"]' + ANIMKEY_SUFFIX)
+            if fc:
+                _entries.append(AnimtextureNode(owner, tree, node, fc))
+    return _entries
+
+
+def get_entries() -> List[AnimtextureNode]:
+    """Returns all animtexture nodes with keyframes."""
+    if _entries is None:
+        return build()
+    return _entries
+
+
+def invalidate(*args):
+    global _entries
+    _entries = None
+
+
+def depsgraph_update(depsgraph):
+    if any(depsgraph.id_type_updated(t) for t in UPDATE_TYPES):
+        invalidate()
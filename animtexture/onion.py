@@ -0,0 +1,67 @@
+"""
+Ghost images of the neighbouring keys for onion skinning.
+
+A ghost is a tinted copy of a key image with reduced alpha. Ghosts are
+computed with numpy and cached by path, mtime and size of the key image,
+so flipping between keys or moving within a held key does not compute
+them again. Does not depend on bpy.
+"""
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+PREV_TINT = (1.0, 0.35, 0.35)
+NEXT_TINT = (0.35, 1.0, 0.35)
+# number of cached ghost buffers
+CACHE_SIZE = 8
+
+
+def make_ghost(pixels: np.ndarray, tint, opacity: float) -> np.ndarray:
+    """Returns RGBA float32 pixels: the image multiplied by `tint`, its alpha by `opacity`."""
+    rgba = np.array(pixels, dtype=np.float32).reshape(-1, 4)
+    rgba[:, :3] *= np.asarray(tint, dtype=np.float32)[:3]
+    rgba[:, 3] *= opacity
+    return rgba.reshape(-1)
+
+
+def get_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class GhostCache():
+    """LRU of ghost buffers: {(path, stamp, tint, opacity) => (width, height, is_float, pixels)}."""
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self.size = size
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, path: str, tint, opacity: float, load) -> Optional[tuple]:
+        """
+        Returns (width, height, is_float, pixels) of the ghost of the image
+        at `path`. `load(path)` returns width, height, is_float and RGBA
+        pixels, it is only called on a cache miss.
+        """
+        stamp = get_stamp(path)
+        if stamp is None:
+            return None
+        key = (path, stamp, tuple(tint), opacity)
+        ghost = self.entries.get(key)
+        if ghost is None:
+            width, height, is_float, pixels = load(path)
+            ghost = (width, height, is_float, make_ghost(pixels, tint, opacity))
+            self.entries[key] = ghost
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        self.entries.move_to_end(key)
+        return ghost
+
+    def clear(self):
+        self.entries.clear()
+
+
+ghosts = GhostCache()
@@ -11,9 +11,28 @@ from bpy.props import (
     BoolProperty, EnumProperty, IntProperty, IntVectorProperty, StringProperty, CollectionProperty
     )
 import os
+import time
+import threading
 import shutil
 import pathlib
-from filecmp import cmp as filecompare
+import numpy as np
+from . import seqindex
+from . import fileops
+from . import keyframes
+from . import encoder
+from . import prefetch
+from . import editors
+from . import nodeindex
+from . import bake
+from . import proxy
+from . import tiles
+from . import container
+from . import pixelcache
+from . import onion
+from . import materialize
+from . import core
+from . import stats
+from .core import get_template
 
 class ANIM_OT_insert_animtexture(Operator):
     """Adds a new animtexture keyframe."""
@@ -82,9 +101,8 @@ class ANIM_OT_insert_animtexture(Operator):
 
         if len(crv.keyframe_points) and (not node.image or node.image.source != "SEQUENCE"):
             if self.delete_keyframes:
-                pts = crv.keyframe_points
-                while len(pts):
-                    pts.remove(pts[0], fast=True)
+                keyframes.clear_keys(crv.keyframe_points)
+                keyframes.invalidate(crv)
             else:
                 bpy.ops.anim.animtexture_insertdelete('INVOKE_DEFAULT')
                 return {'CANCELLED'}
@@ -96,6 +114,7 @@ class ANIM_OT_insert_animtexture(Operator):
         else:
             return self.execute(context)
         
+    @stats.timed("insert")
     def execute(self, context):
         tree = get_active_node_tree(context)
         node = get_active_SNTI(tree)
@@ -114,8 +133,7 @@ class ANIM_OT_insert_animtexture(Operator):
                                     *self.dimensions,
                                     alpha=True)
             
-            buffer = list(self.bg_color) * int(len(img.pixels) / 4)
-            img.pixels.foreach_set(buffer)
+            fill_image(img, self.bg_color)
 
             # create directory
             full_path = bpy.path.abspath(self.directory)
@@ -132,6 +150,8 @@ class ANIM_OT_insert_animtexture(Operator):
             #create template
             shutil.copyfile(bpy.path.abspath(path),
                 bpy.path.abspath(bpy.path.abspath(get_template(path))))
+            seqindex.record_files(full_path, [
+                os.path.basename(path), os.path.basename(get_template(path))])
             
             if img.file_format == 'OPEN_EXR':
                 img.alpha_mode = 'PREMUL'
@@ -140,6 +160,8 @@ class ANIM_OT_insert_animtexture(Operator):
             node.image = img
             node.image_user.use_auto_refresh = True
             node.animtexturekeynext = 0
+            set_lazy_keys(node, [])
+            set_dirty_keys(node, [])
 
             msgbus_subscribe_to(node, tree)
 
@@ -148,12 +170,16 @@ class ANIM_OT_insert_animtexture(Operator):
             
             try:
                 # create new image from template
-                shutil.copyfile(
-                    bpy.path.abspath(get_template(node.image.filepath)),
-                    bpy.path.abspath(os.path.join(
-                        dir,
-                        name + str(node.animtexturekeynext).zfill(padding) + ext))
-                    )
+                materialize_keys(node, [], template=True)
+                template = bpy.path.abspath(get_template(node.image.filepath))
+                target = bpy.path.abspath(os.path.join(
+                    dir, name + str(node.animtexturekeynext).zfill(padding) + ext))
+                if context.preferences.addons[__package__].preferences.lazyKeys:
+                    if fileops.link_lazy(template, target):
+                        add_lazy_keys(node, [node.animtexturekeynext])
+                else:
+                    shutil.copyfile(template, target)
+                store_keys(node, [node.animtexturekeynext])
             except OSError as e:
                 # if the template file is missing, call dialog box operator (missing template error) 
                 path = bpy.path.abspath(get_template(node.image.filepath))
@@ -166,8 +192,7 @@ class ANIM_OT_insert_animtexture(Operator):
         # create keyframe
         node.animtexturekey = node.animtexturekeynext
         node.animtexturekeynext += 1
-        tree.keyframe_insert(data_path=datapath)
-        crv.keyframe_points[-1].interpolation = 'CONSTANT'
+        keyframes.insert_keys(crv, [(context.scene.frame_current, node.animtexturekey)])
 
         update_node_color(node)
 
@@ -190,6 +215,7 @@ class ANIM_OT_duplicate_animtexture(Operator):
             len(get_keyframes_of_SNTI(node_tree, node)) and
             node.image and node.image.source == "SEQUENCE")
     
+    @stats.timed("duplicate")
     def execute(self, context):
         tree = get_active_node_tree(context)
         node = get_active_SNTI(tree)
@@ -197,10 +223,8 @@ class ANIM_OT_duplicate_animtexture(Operator):
         crv = tree.animation_data.action.fcurves.find(datapath)
         
         frame = int(context.scene.frame_current)
-        key = int(crv.evaluate(frame))
-        all_keys = [int(k.co.y) for k in crv.keyframe_points]
-        if key not in all_keys:
-            self.report({'ERROR'}, "The keyframes seem to be faulty. Check that their interpolation is set to CONSTANT. Also file this as a bug.")
+        key = keyframes.get_index(crv).image_at(frame)
+        if key is None:
             return {'CANCELLED'}
 
         # save active image
@@ -209,24 +233,28 @@ class ANIM_OT_duplicate_animtexture(Operator):
         override['area'] = image_editor
 
         image_editor.spaces.active.image = node.image
-        image_editor.spaces.active.image_user.frame_duration = frame
-        image_editor.spaces.active.image_user.frame_offset = key - frame
+        set_image_user(image_editor.spaces.active.image_user, key)
         context.scene.frame_set(frame)
+        dir, name, padding, ext = get_sequence_path_info(node.image.filepath)
+        unlink_lazy_keys(node, [key])
         res = bpy.ops.image.save(override)
+        relink_lazy_keys(node, [key])
         restore_image_editor()
 
-        # then duplicate it
-        dir, name, padding, ext = get_sequence_path_info(node.image.filepath)
-        shutil.copyfile(
-            bpy.path.abspath(os.path.join(dir, name + str(key).zfill(padding) + ext)),
-            bpy.path.abspath(os.path.join(dir, name + str(node.animtexturekeynext).zfill(padding) + ext))
-            )
+        # then duplicate it, a key which still shows the template stays lazy
+        source = bpy.path.abspath(os.path.join(dir, name + str(key).zfill(padding) + ext))
+        target = bpy.path.abspath(os.path.join(dir, name + str(node.animtexturekeynext).zfill(padding) + ext))
+        if key in get_lazy_keys(node) and fileops.link_lazy(
+                bpy.path.abspath(get_template(node.image.filepath)), target):
+            add_lazy_keys(node, [node.animtexturekeynext])
+        else:
+            fileops.copy_fresh(source, target)
+        store_keys(node, [key, node.animtexturekeynext])
 
         # insert a new keyframe for the duplicated image
         node.animtexturekey = node.animtexturekeynext
         node.animtexturekeynext += 1
-        tree.keyframe_insert(data_path=datapath)
-        crv.keyframe_points[-1].interpolation = 'CONSTANT'
+        keyframes.insert_keys(crv, [(frame, node.animtexturekey)])
 
         return {'FINISHED'}
 
@@ -244,73 +272,129 @@ class ANIM_OT_save_animtexture(Operator):
         default=False
         )
 
+    @stats.timed("save")
     def execute(self, context):
-        class Img():
-            def __init__(self,
-                    image: Image,
-                    node: Node,
-                    keyframes: FCurveKeyframePoints) -> None:
-                self.image = image
-                self.node = node
-                self.keyframes = keyframes
-        images = []
-
-        # store references to animtexture nodes and their keyframes
-        if self.save_all:
-            for mat in bpy.data.materials:
-                if (    not mat.use_nodes or
-                        not mat.node_tree.animation_data or
-                        not mat.node_tree.animation_data.action):
-                    continue
-                for node in mat.node_tree.nodes:
-                    keys = get_keyframes_of_SNTI(mat.node_tree, node)
-                    if len(keys) > 0:
-                        images.append(Img(node.image, node, keys))
-        else:
-            node_tree = get_active_node_tree(context)
-            node = get_active_SNTI(node_tree)
-            keys = get_keyframes_of_SNTI(node_tree, node)
-            if len(keys) > 0:
-                images.append(Img(node.image, node, keys))
-
+        images = get_sequences(context, self.save_all)
         if not len(images):
             return {'FINISHED'}
 
-        # create error list, setup image editor override
+        # create error list, the image editor override is set up on demand
         errors = []
-        image_editor, restore_image_editor = get_image_editor(context)
-        override = context.copy()
-        override['area'] = image_editor
+        editor = ImageEditorOverride(context)
+        for img in images:
+            error = save_sequence(context, img, editor)
+            if error:
+                errors.append(error)
+        editor.restore()
+        
+        if len(errors):
+            self.report({'WARNING'}, "Some files failed. Look in the console.")
+            print("Failed to save animtexture image sequences:")
+            for e in errors:
+                print(e)
+        return {'FINISHED'}
 
-        # iterate trough animtexture image node list and check for errors
+
+class ANIM_OT_save_async_animtexture(Operator):
+    """Saves the painted keys of the animated texture images in the background."""
+    bl_label = "Save (Background)"
+    bl_idname = "anim.animtexture_save_async"
+    bl_description = "Encode and write the painted Animtexture Keyframes in the background"
+    bl_options = {'REGISTER'}
+
+    save_all: bpy.props.BoolProperty(
+        name='Save All',
+        description='Save all AnimTexture-sequence which are active in nodes, even if the nodes are not selected.',
+        default=False
+        )
+
+    @stats.timed("save_async")
+    def execute(self, context):
+        images = get_sequences(context, self.save_all)
+        jobs = []
+        errors = []
+        # [(node, directory, image numbers, paths)] of the submitted jobs
+        self._pending = []
+        editor = ImageEditorOverride(context)
         for img in images:
-            if not img.image:
-                errors.append(img.node.name + " - node has no texture selected.")
-                continue 
-            if img.image.source != "SEQUENCE":
-                errors.append(img.image.name + " - is no image sequence.")
+            if not img.image or img.image.source != "SEQUENCE":
+                errors.append(save_sequence(context, img, editor))
                 continue
-            
-            # save image sequence
+            mark_dirty_key(img.node)
+            dirty = sorted(get_dirty_keys(img.node))
+            if not dirty:
+                continue
+
+            # the displayed key is copied now, the other keys were copied
+            # by the frame change handler, when they were left
             i = img.image
-            absfilepath = bpy.path.abspath(i.filepath)
-            dir, name, padding, ext = get_sequence_path_info(absfilepath)
-            if not os.path.exists(dir):
-                errors.append(i.name)
+            snapshot_dirty_key(img.node)
+            img_jobs = [encoder.snapshots.get((i.name, v)) for v in dirty]
+            if not all(img_jobs):
+                # blender has to save other formats and keys without a copy
+                errors.append(save_sequence(context, img, editor))
                 continue
-            image_editor.spaces.active.image = i
-            bpy.ops.image.save_sequence(override)
+            for v in dirty:
+                del encoder.snapshots[(i.name, v)]
+            set_dirty_keys(img.node, [])
+            reset_painted_state(img.node)
+            jobs += img_jobs
+            self._pending.append((img.node, os.path.dirname(img_jobs[0].path),
+                dirty, [job.path for job in img_jobs]))
+        editor.restore()
+        self._errors = [e for e in errors if e]
+
+        if not jobs:
+            return self.report_errors()
 
-            # delete unused (left over) images
-            if context.preferences.addons[__package__].preferences.reorganizeOnSave:
-                clean_directory(img.keyframes, absfilepath)
+        wm = context.window_manager
+        self._encoder = encoder.AsyncEncoder()
+        self._encoder.submit(jobs)
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.progress_begin(0, len(jobs))
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
 
-        restore_image_editor()
-        
-        if len(errors):
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._encoder.cancel()
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        finished, total = self._encoder.progress()
+        context.window_manager.progress_update(finished)
+        if not self._encoder.done():
+            return {'PASS_THROUGH'}
+
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        written, errors = self._encoder.results()
+        self._encoder.shutdown()
+        self._errors += errors
+
+        written = set(written)
+        for node, dir, numbers, paths in self._pending:
+            done = [v for v, path in zip(numbers, paths) if path in written]
+            try:
+                # written lazy keys are materialised, failed keys stay dirty
+                set_lazy_keys(node, get_lazy_keys(node).difference(done))
+                set_dirty_keys(node, get_dirty_keys(node).union(
+                    set(numbers).difference(done)))
+            except ReferenceError:
+                pass
+            try:
+                store_keys(node, [v for v, path in zip(numbers, paths) if path in written])
+            except ReferenceError:
+                seqindex.record_files(dir, [os.path.basename(path)
+                    for path in paths if path in written])
+        self.report({'INFO'}, "Saved " + str(len(written)) + " images.")
+        return self.report_errors()
+
+    def report_errors(self):
+        if len(self._errors):
             self.report({'WARNING'}, "Some files failed. Look in the console.")
             print("Failed to save animtexture image sequences:")
-            for e in errors:
+            for e in self._errors:
                 print(e)
         return {'FINISHED'}
 
@@ -325,6 +409,11 @@ class ANIM_OT_import_animtexture(Operator):
     filepath: bpy.props.StringProperty(subtype="FILE_PATH")
     stop_at_gaps: bpy.props.BoolProperty(name="Stop at Gaps", default=False)
     use_rel_path: bpy.props.BoolProperty(name="Make Relative", default=True)
+    collapse_duplicates: bpy.props.BoolProperty(
+        name="Collapse Duplicates",
+        description="Images with the same content share one image file, even if they are not adjacent.",
+        default=True
+        )
 
     def invoke(self, context, event):
         context.window_manager.fileselect_add(self)
@@ -338,7 +427,7 @@ class ANIM_OT_import_animtexture(Operator):
             return {'CANCELLED'}
 
         # open second file browser to set working directory
-        bpy.ops.anim.animtexture_set_working_dir('INVOKE_DEFAULT', import_filepath = self.filepath, stop_at_gaps = self.stop_at_gaps, use_rel_path = self.use_rel_path)
+        bpy.ops.anim.animtexture_set_working_dir('INVOKE_DEFAULT', import_filepath = self.filepath, stop_at_gaps = self.stop_at_gaps, use_rel_path = self.use_rel_path, collapse_duplicates = self.collapse_duplicates)
 
         return {'FINISHED'}
 
@@ -363,6 +452,10 @@ class ANIM_OT_import_set_working_directory_animtexture(Operator):
         name="Make Relative",
         options ={'HIDDEN'}
     )
+    collapse_duplicates: bpy.props.BoolProperty(
+        name="Collapse Duplicates",
+        options ={'HIDDEN'}
+    )
     directory: bpy.props.StringProperty(
         name="Import - Working directory Path",
         description="Working directory Path for importing sequence"
@@ -372,58 +465,26 @@ class ANIM_OT_import_set_working_directory_animtexture(Operator):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+    @stats.timed("import")
     def execute(self, context):
 
-        # get info of the import files in directory
+        # copy one image per distinct content into the working directory,
+        # a new keyframe is added whenever the content changes
         dir, name, padding, ext = get_sequence_path_info(self.import_filepath)
-        all_files = os.listdir(dir)
+        keys, count, has_template = core.import_sequence(
+            bpy.path.abspath(self.import_filepath),
+            bpy.path.abspath(self.directory),
+            collapse=self.collapse_duplicates)
 
-        first_image_name = name + "0" * padding + ext
-        
-        # duplicate template if it exists, otherwise create new empty template
-        template_name = get_template(first_image_name)
-        if template_name in all_files:
-            shutil.copyfile(
-                bpy.path.abspath(os.path.join(dir, template_name)),
-                bpy.path.abspath(os.path.join(self.directory, template_name))
-                )
-        else:
+        # create new empty template, if the sequence has none
+        if not has_template:
+            template_name = get_template(name + "0" * padding + ext)
             tmp_img = bpy.data.images.load(self.import_filepath)
-            buffer = [tmp_img.pixels[0] * 0] * len(tmp_img.pixels)
-            tmp_img.pixels.foreach_set(buffer)
+            fill_image(tmp_img, (0.0, 0.0, 0.0, 0.0))
             tmp_img.filepath_raw = os.path.join(self.directory, template_name)
             tmp_img.save()
             bpy.data.images.remove(tmp_img)
-
-        # create list of files that are part of the sequence and sort them    
-        length = len(name) + padding + len(ext)
-        files = [f for f in all_files
-            if f.startswith(name)
-                and len(f) == length
-                and f[len(name):len(name) + padding].isdigit()
-                and f.endswith(ext)]
-        files.sort()
-
-        # image a is compared to image b, if they are different
-        # a new keyframe is added until the last image is reached
-        index_start, index_end = len(name), len(name) + padding
-        img_a = os.path.basename(self.import_filepath)
-        start = files.index(img_a)
-        keys = [int(img_a[index_start:index_end])]
-        for i in range(start + 1, len(files)):
-            img_b = files[i]
-            files_are_same = filecompare(os.path.join(dir, img_a),
-                                        os.path.join(dir, img_b))
-            if not files_are_same:
-                keys.append(int(img_b[index_start:index_end]))
-                img_a = img_b
-
-        # movecopy key images into new working directory        
-        for i, key in enumerate(keys):
-            shutil.copyfile(
-                bpy.path.abspath(os.path.join(dir, name + str(key).zfill(padding) + ext)),
-                bpy.path.abspath(os.path.join(self.directory, name + str(i).zfill(padding) + ext))
-                )
+            seqindex.record_files(bpy.path.abspath(self.directory), [template_name])
 
         # create/overwrite keyframes
         tree = get_active_node_tree(context)
@@ -434,18 +495,14 @@ class ANIM_OT_import_set_working_directory_animtexture(Operator):
         if not crv:
             crv = tree.animation_data.action.fcurves.new(datapath)
 
-        while len(crv.keyframe_points) > len(keys):
-            crv.keyframe_points.remove(crv.keyframe_points[0], fast=True)
-        if len(crv.keyframe_points) < len(keys):
-            crv.keyframe_points.add(len(keys) - len(crv.keyframe_points))
-        for i in range(len(keys)):
-            pt = crv.keyframe_points[i]
-            pt.co.x = keys[i]
-            pt.co.y = i
-            pt.interpolation = 'CONSTANT'
+        keyframes.write_keys(crv.keyframe_points, keys)
+        crv.update()
+        keyframes.invalidate(crv)
             
         # set new image path in node
-        node.animtexturekeynext = keys[-1] + 1
+        node.animtexturekeynext = count
+        set_lazy_keys(node, [])
+        set_dirty_keys(node, [])
         new_path = os.path.join(self.directory, name + "0" * padding + ext)
         if self.use_rel_path and bpy.data.is_saved:
             new_path = bpy.path.relpath(new_path)
@@ -456,7 +513,9 @@ class ANIM_OT_import_set_working_directory_animtexture(Operator):
             node.image.alpha_mode = 'PREMUL'
         node.image.source = 'SEQUENCE'
         node.image_user.use_auto_refresh = True
-        node.animtexturekey = int(crv.evaluate(context.scene.frame_current))
+        key = keyframes.get_index(crv).image_at(context.scene.frame_current)
+        if key is not None:
+            node.animtexturekey = key
 
         update_node_color(node)
 
@@ -490,6 +549,7 @@ class ANIM_OT_import_single_animtexture(Operator):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+    @stats.timed("import_single")
     def execute(self, context):
         tree = get_active_node_tree(context)
         node = get_active_SNTI(tree)
@@ -507,14 +567,13 @@ class ANIM_OT_import_single_animtexture(Operator):
             bpy.path.abspath(os.path.join(dir,
                 name + str(node.animtexturekeynext).zfill(padding) + ext2))
             )
+        store_keys(node, [node.animtexturekeynext])
 
         # insert a new keyframe for the imported image file
-        datapath = get_animkeydatapath(node.name)
-        keyframe_points = get_keyframes_of_SNTI(tree, node)
+        crv = tree.animation_data.action.fcurves.find(get_animkeydatapath(node.name))
         node.animtexturekey = node.animtexturekeynext
         node.animtexturekeynext += 1
-        tree.keyframe_insert(data_path=datapath)
-        keyframe_points[-1].interpolation = 'CONSTANT'
+        keyframes.insert_keys(crv, [(context.scene.frame_current, node.animtexturekey)])
 
         return {'FINISHED'}
 
@@ -538,6 +597,22 @@ class ANIM_OT_export_animtexture(Operator):
         default=True,
         description="Include template in exported files"
         )
+    link_mode: bpy.props.EnumProperty(
+        name="Held Frames",
+        description="How frames, which repeat an already exported image, are written",
+        items = [
+            ('COPY', 'Copy', 'Write a full copy for every frame'),
+            ('AUTO', 'Link (Auto)', 'Use a reflink, hardlink or symlink, whichever the file system supports'),
+            ('REFLINK', 'Reflink', 'Copy-on-write clone, falls back to other links'),
+            ('HARDLINK', 'Hardlink', 'Hardlink, falls back to other links'),
+            ('SYMLINK', 'Symlink', 'Relative symlink, falls back to other links')],
+        default='COPY'
+        )
+    incremental: bpy.props.BoolProperty(
+        name="Incremental",
+        default=True,
+        description="Skip files which did not change since the last export into this directory"
+        )
 
     def invoke(self, context, event):
         
@@ -554,6 +629,7 @@ class ANIM_OT_export_animtexture(Operator):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+    @stats.timed("export")
     def execute(self, context):
         tree = get_active_node_tree(context)
         node = get_active_SNTI(tree)
@@ -561,42 +637,27 @@ class ANIM_OT_export_animtexture(Operator):
         abspath = bpy.path.abspath(node.image.filepath)
         dir, name, padding, ext = get_sequence_path_info(abspath)
 
-        keyframes = get_keyframes_of_SNTI(tree, node)
+        crv = tree.animation_data.action.fcurves.find(get_animkeydatapath(node.name))
+        index = keyframes.get_index(crv)
         # keys: {frame => image_number}
-        keys = {int(k.co.x):int(k.co.y) for k in keyframes}
+        keys = index.keys()
 
         # if filling gaps is required, assign an image_number to EACH frame
         if self.fill_gaps:
-            frames = range(context.scene.frame_start, context.scene.frame_end + 1)
-            keys = {frame:keys[
-                        max([min(keys.keys())] + [k for k in keys.keys() if k <= frame])
-                    ]
-                    for frame in frames}
+            keys = index.image_range(context.scene.frame_start, context.scene.frame_end)
 
         # create a lookup of input and output files
         # files: {target -> str: source -> str}
-        files = {name + str(frame).zfill(padding) + ext:
-                    name + str(image_number).zfill(padding) + ext
-                    for frame, image_number in keys.items()
-                }
-        if self.include_template:
-            template_name = get_template(os.path.basename(abspath))
-            files[template_name] = template_name
-
-        missing_files = set()
-        failed_files = set()
-        for file_target, file_source in files.items():
-            path_in = os.path.join(dir, file_source)
-            path_export = os.path.join(self.directory, file_target)
-            try:
-                shutil.copyfile(path_in, path_export)
-            except OSError as e:
-                # if the image file is missing or failed to copy,
-                # add the image path to error list 
-                if not pathlib.Path(path_in).exists():
-                    missing_files.add(file_source)
-                else:
-                    failed_files.add(file_source + " > " + file_target)
+        files = core.get_export_files(keys, name, padding, ext,
+            get_lazy_keys(node), self.include_template)
+
+        # packed and sparse keys are written for the export and removed afterwards
+        composed = materialize_keys(node, set(keys.values()), template=True)
+
+        missing_files, failed_files = core.export_sequence(dir, files,
+            bpy.path.abspath(self.directory), self.link_mode, self.incremental)
+        for path in composed:
+            fileops.remove_existing(path)
         
         for msg, files in [ ["Missing", missing_files],
                             ["Failed", failed_files] ]:
@@ -611,6 +672,205 @@ class ANIM_OT_export_animtexture(Operator):
         return {'FINISHED'}
 
 
+class ANIM_OT_bake_animtexture(Operator):
+    """Bakes the animtexture keys into keyframes of the image user offset."""
+    bl_label = "Bake for Rendering"
+    bl_idname = "anim.animtexture_bake"
+    bl_description = "Key the image offset of all animtexture nodes, so the file renders without the addon"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    clear: bpy.props.BoolProperty(
+        name="Clear",
+        description="Remove the baked image offset keyframes",
+        default=False
+        )
+
+    @stats.timed("bake")
+    def execute(self, context):
+        count, missing = bake.bake_all(clear=self.clear, write_files=write_loose_keys)
+        if missing:
+            print("Missing Files:")
+            for label, files in missing.items():
+                print("  ", label + ":", ", ".join(files))
+            self.report({'WARNING'}, str(len(missing)) + " animtexture nodes were not "
+                "baked, their images are missing. Look in the console for a complete list.")
+            return {'FINISHED'}
+        self.report({'INFO'}, ("Cleared " if self.clear else "Baked ") +
+            str(count) + " animtexture nodes.")
+        return {'FINISHED'}
+
+
+class ANIM_OT_proxy_animtexture(Operator):
+    """Builds reduced resolution proxies of the active animtexture sequence."""
+    bl_label = "Build Proxies"
+    bl_idname = "anim.animtexture_proxy"
+    bl_description = "Build reduced resolution images for viewport playback in the background"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        return (node and node.image and node.image.source == 'SEQUENCE'
+            and node.animtextureproxy != 'NONE')
+
+    def execute(self, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        self._processes = start_proxy_workers(node, get_proxy_factor(node))
+        if not self._processes:
+            self.report({'INFO'}, "Proxies are up to date.")
+            return {'FINISHED'}
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if any(p.poll() is None for p in self._processes):
+            return {'PASS_THROUGH'}
+        context.window_manager.event_timer_remove(self._timer)
+        failed = sum(p.returncode != 0 for p in self._processes)
+        if failed:
+            self.report({'WARNING'}, str(failed) + " proxy processes failed.")
+        else:
+            self.report({'INFO'}, "Proxies built.")
+        return {'FINISHED'}
+
+
+class ANIM_OT_sparse_animtexture(Operator):
+    """Stores keys as tiles, which differ from the template, or restores the full images."""
+    bl_label = "Sparse Keys"
+    bl_idname = "anim.animtexture_sparse"
+    bl_description = "Store keys, which differ from the template in few tiles, as sparse files"
+    bl_options = {'REGISTER'}
+
+    unpack: bpy.props.BoolProperty(
+        name="Unpack",
+        description="Write the full images of all sparse keys again",
+        default=False
+        )
+
+    @classmethod
+    def poll(cls, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        return node and node.image and node.image.source == 'SEQUENCE'
+
+    @stats.timed("sparse")
+    def execute(self, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        if self.unpack:
+            written = compose_sparse_keys(node, keep_sparse=False)
+            seqindex.record_files(os.path.dirname(bpy.path.abspath(node.image.filepath)),
+                [os.path.basename(p) for p in written])
+            self.report({'INFO'}, "Unpacked " + str(len(written)) + " keys.")
+        else:
+            count = pack_sparse_keys(node)
+            self.report({'INFO'}, str(count) + " keys are stored sparse.")
+        node.image.reload()
+        return {'FINISHED'}
+
+
+class ANIM_OT_container_animtexture(Operator):
+    """Packs the images of the sequence into a single container file or unpacks them."""
+    bl_label = "Container"
+    bl_idname = "anim.animtexture_container"
+    bl_description = "Store the images of the sequence in a single container file"
+    bl_options = {'REGISTER'}
+
+    unpack: bpy.props.BoolProperty(
+        name="Unpack",
+        description="Write the container as a plain image sequence",
+        default=False
+        )
+
+    @classmethod
+    def poll(cls, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        return node and node.image and node.image.source == 'SEQUENCE'
+
+    @stats.timed("container")
+    def execute(self, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        keys = get_keyframes_of_SNTI(tree, node)
+        if self.unpack:
+            count = unpack_keys(node, keys)
+            self.report({'INFO'}, "Unpacked " + str(count) + " images.")
+        else:
+            mark_dirty_key(node)
+            if get_dirty_keys(node):
+                self.report({'ERROR'}, "Save the painted keys before packing.")
+                return {'CANCELLED'}
+            count = pack_keys(node, keys)
+            if "ATK" in node:
+                materialize_keys(node, [int(node["ATK"])])
+            self.report({'INFO'}, "Packed " + str(count) + " images.")
+        node.image.reload()
+        return {'FINISHED'}
+
+
+class ANIM_OT_onion_animtexture(Operator):
+    """Shows the previous and next key as tinted ghosts."""
+    bl_label = "Onion Skin"
+    bl_idname = "anim.animtexture_onion"
+    bl_description = "Mix the previous and next key images over the active texture node"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        return node and node.image and node.image.source == 'SEQUENCE'
+
+    def execute(self, context):
+        tree = get_active_node_tree(context)
+        node = get_active_SNTI(tree)
+        if tree.get("ATO") == node.name:
+            onion_disable(tree)
+        else:
+            onion_enable(tree, node)
+            nodeindex.invalidate()
+            onion_update_all(context.scene)
+        return {'FINISHED'}
+
+
+class ANIM_OT_stats_animtexture(Operator):
+    """Writes the timing statistics to a json file or resets them."""
+    bl_label = "Timing Statistics"
+    bl_idname = "anim.animtexture_stats"
+    bl_description = "Write the timing statistics of AnimTexture to a json file"
+    bl_options = {'REGISTER'}
+
+    filepath: bpy.props.StringProperty(
+        subtype="FILE_PATH"
+        )
+    reset: bpy.props.BoolProperty(
+        name="Reset",
+        description="Reset the statistics instead of writing them",
+        default=False
+        )
+
+    def invoke(self, context, event):
+        if self.reset:
+            return self.execute(context)
+        self.filepath = "animtexture_stats.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        if self.reset:
+            stats.reset()
+        else:
+            stats.dump(bpy.path.abspath(self.filepath))
+        return {'FINISHED'}
+
+
 class ANIM_OT_openimage_animtexture(Operator):
     """Looks for an active ShaderNodeTextureImage with an image sequence and opens it in a UV Editor."""
     bl_label = "Open in Editor"
@@ -632,8 +892,9 @@ class ANIM_OT_openimage_animtexture(Operator):
         for area in context.screen.areas:
             if area.type in ['IMAGE_EDITOR', 'UV_EDITOR']:
                 area.spaces.active.image = node.image
-                area.spaces.active.image_user.frame_duration = node.image_user.frame_duration
-                area.spaces.active.image_user.frame_offset = node.image_user.frame_offset
+                set_image_user(area.spaces.active.image_user,
+                    node.image_user.frame_offset + 1)
+                editors.invalidate()
                 return {'FINISHED'}
 
         self.report({'WARNING'}, "Open an ImageEditor or UV Editor first.")
@@ -691,8 +952,7 @@ class ANIM_OT_insertmissingtemplate_animtexture(Operator):
         #  and save it as the template file
         tmp_img = bpy.data.images.load(node.image.filepath)
 
-        buffer = list(self.color) * int(len(tmp_img.pixels) / 4)
-        tmp_img.pixels.foreach_set(buffer)
+        fill_image(tmp_img, self.color)
         tmp_img.filepath_raw = template_path
         tmp_img.save()
         bpy.data.images.remove(tmp_img)
@@ -708,62 +968,589 @@ class ANIM_OT_insertmissingtemplate_animtexture(Operator):
         wm = context.window_manager
         return wm.invoke_props_dialog(self)
 
-def get_template(path: str) -> string:
-    """Returns template name with extension."""
-    if "." not in path:
-        raise Exception("Path does not contain a file extension.")
-    ext = "." + path.split(".")[-1]
-    return path[:-len(ext)] + "template" + ext
+def fill_image(img: Image, color):
+    """Fills all pixels of an image with a color, using a single float32 buffer."""
+    channels = img.channels
+    buffer = np.empty(len(img.pixels), dtype=np.float32)
+    buffer.reshape(-1, channels)[:] = tuple(color)[:channels]
+    img.pixels.foreach_set(buffer)
 
-def clean_directory(keyframe_points, absfilepath):
+def clean_directory(keyframe_points, absfilepath, node=None):
     """
         Removes all images except for the required images from the animtexture
         directory. Renames the remaining images consecutively (0, 1, 2, ...)
         and changes the keyframes_point values to match.
+        Lazy, sparse and dirty keys of the `node` are renumbered as well.
+    """
+    co, key_values = get_key_values(keyframe_points)
+    sparse = get_sparse_keys(node) if node else set()
+    # loose files are tracked by name, renumbering would mix them up
+    release_loose_files(0)
+    dir = os.path.dirname(absfilepath)
+    materializer = materialize.get_materializer()
+    materializer.forget([p for p in list(materializer.written) if os.path.dirname(p) == dir])
+    renumber = core.reorganize(absfilepath, key_values, sparse)
+    apply_renumber(keyframe_points, node, renumber, co, key_values)
+    return len(renumber)
+
+def get_key_values(keyframe_points):
+    """Returns the flat keyframe coordinates and the image numbers of the keys."""
+    co = [0.0] * (2 * len(keyframe_points))
+    keyframe_points.foreach_get("co", co)
+    return co, [int(v) for v in co[1::2]]
+
+def apply_renumber(keyframe_points, node, renumber, co, key_values):
+    """Changes the keyframe values and the lazy, sparse and dirty keys to the new image numbers."""
+    co[1::2] = [renumber[v] for v in key_values]
+    keyframe_points.foreach_set("co", co)
+    keyframes.invalidate()
+    if node:
+        set_lazy_keys(node, [renumber[v] for v in get_lazy_keys(node) if v in renumber])
+        set_sparse_keys(node, [renumber[v] for v in get_sparse_keys(node) if v in renumber])
+        set_dirty_keys(node, [renumber[v] for v in get_dirty_keys(node) if v in renumber])
+        state = painted_state.get(node.as_pointer())
+        if state and state[0] in renumber:
+            state[0] = renumber[state[0]]
+        if node.image:
+            renumber_snapshots(node.image, renumber)
+
+def renumber_snapshots(image: Image, renumber):
+    """Moves the pixel snapshots of unsaved keys to their new image numbers."""
+    moved = [(v, encoder.snapshots.pop((image.name, v))) for name, v in list(encoder.snapshots)
+        if name == image.name and v in renumber]
+    for v, job in moved:
+        job.path = get_image_path(image.filepath, renumber[v])
+        encoder.snapshots[(image.name, renumber[v])] = job
+
+def recover_directories(entries):
+    """
+        Completes or reverts reorganizes, which were interrupted (by a crash),
+        in the directories of the animtexture nodes. Nodes, whose keys still
+        use the old image numbers, are renumbered.
+    """
+    journals = {}
+    for entry in entries:
+        if not entry.image or not entry.image.filepath:
+            continue
+        absfilepath = bpy.path.abspath(entry.image.filepath)
+        dir = os.path.dirname(absfilepath)
+        if dir not in journals:
+            try:
+                journals[dir] = core.recover(dir)
+            except OSError as e:
+                print("animtexture: Could not recover", dir, e)
+                journals[dir] = None
+        if journals[dir] is None:
+            continue
+        co, key_values = get_key_values(entry.keyframes)
+        renumber = core.get_lookup(journals[dir], absfilepath, key_values)
+        if renumber is not None:
+            apply_renumber(entry.keyframes, entry.node, renumber, co, key_values)
+
+
+def get_number_set(node: ShaderNodeTexImage, prop: str) -> set:
+    """Returns a set of image numbers, which is stored in a node property."""
+    return set(node.get(prop, []))
+
+def set_number_set(node: ShaderNodeTexImage, prop: str, numbers):
+    if len(numbers):
+        node[prop] = sorted(numbers)
+    elif prop in node:
+        del node[prop]
+
+def get_image_path(filepath: str, number: int) -> str:
+    """Returns the absolute path of an image number of the sequence at `filepath`."""
+    dir, name, padding, ext = get_sequence_path_info(filepath)
+    return os.path.join(dir, name + str(number).zfill(padding) + ext)
+
+def get_lazy_keys(node: ShaderNodeTexImage) -> set:
+    """Returns the image numbers of keys, which are links to the template."""
+    return get_number_set(node, "ATL")
+
+def set_lazy_keys(node: ShaderNodeTexImage, numbers):
+    set_number_set(node, "ATL", numbers)
+
+def add_lazy_keys(node: ShaderNodeTexImage, numbers):
+    set_lazy_keys(node, get_lazy_keys(node).union(numbers))
+
+def get_sparse_keys(node: ShaderNodeTexImage) -> set:
+    """Returns the image numbers of keys, which are stored as tiles relative to the template."""
+    return get_number_set(node, "ATS")
+
+def set_sparse_keys(node: ShaderNodeTexImage, numbers):
+    set_number_set(node, "ATS", numbers)
+
+def get_pixel_cache():
+    """Returns the on-disk pixel cache or None, if it is disabled."""
+    preferences = bpy.context.preferences.addons[__package__].preferences
+    if not preferences.pixelCache:
+        return None
+    directory = preferences.pixelCacheDirectory or bpy.utils.user_resource(
+        'DATAFILES', path="animtexture_pixels", create=True)
+    return pixelcache.get_cache(bpy.path.abspath(directory),
+        preferences.pixelCacheBudget * 2**20)
+
+def read_image_pixels(path: str):
+    """
+    Loads an image file. Returns width, height, is_float and RGBA float32
+    pixels. The pixels are memory mapped from the pixel cache, if possible.
+    """
+    cache = get_pixel_cache()
+    if cache:
+        cached = cache.get(path)
+        if cached:
+            return cached
+    img = bpy.data.images.load(path, check_existing=False)
+    try:
+        width, height = img.size
+        channels = img.channels
+        pixels = np.empty(width * height * channels, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        is_float = img.is_float
+    finally:
+        bpy.data.images.remove(img)
+    if channels != 4:
+        rgba = np.ones((width * height, 4), dtype=np.float32)
+        rgba[:, :channels] = pixels.reshape(-1, channels)
+        pixels = rgba.reshape(-1)
+    if cache:
+        cache.put(path, width, height, is_float, pixels)
+    return width, height, is_float, pixels
+
+def write_image_pixels(path: str, width: int, height: int, is_float: bool,
+        pixels: np.ndarray, file_format: str):
+    """Saves RGBA float32 pixels as an image file."""
+    img = bpy.data.images.new("AT_tmp", width, height, alpha=True, float_buffer=is_float)
+    try:
+        img.pixels.foreach_set(pixels)
+        img.filepath_raw = path
+        img.file_format = file_format
+        img.save()
+    finally:
+        bpy.data.images.remove(img)
+
+def pack_sparse_keys(node: ShaderNodeTexImage) -> int:
+    """
+    Stores the keys of a node, which differ from the template in few tiles,
+    as sparse files and removes their full image. Returns the number of keys.
+    """
+    dir, name, padding, ext = get_sequence_path_info(node.image.filepath)
+    template = bpy.path.abspath(get_template(node.image.filepath))
+    width, height, is_float, base = read_image_pixels(template)
+    sparse = get_sparse_keys(node)
+    lazy = get_lazy_keys(node)
+    index = seqindex.get_index(dir)
+    numbers = {int(k.co.y) for k in get_keyframes_of_SNTI(
+        node.id_data, node)}.difference(sparse, lazy)
+    for v in sorted(numbers):
+        file = name + str(v).zfill(padding) + ext
+        path = os.path.join(dir, file)
+        if not os.path.exists(path):
+            continue
+        w, h, is_float, pixels = read_image_pixels(path)
+        if (w, h) != (width, height):
+            continue
+        coords, data = tiles.diff_tiles(base, pixels, width, height, 4)
+        if not tiles.is_sparse_worthy(coords, width, height):
+            continue
+        tiles.save_sparse(tiles.get_sparse_path(dir, file),
+            coords, data, width, height, 4, is_float)
+        os.remove(path)
+        index.remove(file)
+        sparse.add(v)
+    index.write()
+    set_sparse_keys(node, sparse)
+    return len(sparse)
+
+def compose_sparse_keys(node: ShaderNodeTexImage, numbers=None, keep_sparse=True) -> list:
+    """
+    Writes the full image files of sparse keys (restricted to `numbers`),
+    if they are missing. Returns the paths of the written files. With
+    `keep_sparse` the files are temporary and removed, when they have not
+    been displayed for a while.
+    """
+    sparse = get_sparse_keys(node)
+    if numbers is not None:
+        sparse = sparse.intersection(numbers)
+    if not sparse:
+        return []
+    filepath = bpy.path.abspath(node.image.filepath)
+    dir, name, padding, ext = core.get_sequence_path_info(filepath)
+    template = get_template(filepath)
+    materializer = materialize.get_materializer()
+    base = None
+    written = []
+    for v in sparse:
+        file = name + str(v).zfill(padding) + ext
+        path = os.path.join(dir, file)
+        materializer.wait(path)
+        if os.path.exists(path):
+            continue
+        data = tiles.load_sparse(tiles.get_sparse_path(dir, file))
+        if data is None:
+            continue
+        if base is None:
+            width, height, is_float, base = read_image_pixels(template)
+        write_image_pixels(path, width, height, is_float,
+            tiles.compose(base, data), node.image.file_format)
+        written.append(path)
+    if keep_sparse:
+        materializer.record(written)
+    else:
+        materializer.forget(os.path.join(dir, name + str(v).zfill(padding) + ext)
+            for v in sparse)
+        for v in sparse:
+            fileops.remove_existing(tiles.get_sparse_path(dir,
+                name + str(v).zfill(padding) + ext))
+        set_sparse_keys(node, get_sparse_keys(node).difference(sparse))
+    return written
+
+def prefetch_sparse_keys(node: ShaderNodeTexImage, numbers):
+    """
+    Composes the missing files of upcoming sparse keys on a background
+    thread. Only 8 bit PNG sequences can be written without Blender.
+    """
+    sparse = get_sparse_keys(node).intersection(numbers)
+    if not sparse or node.image.file_format != 'PNG' or node.image.is_float:
+        return
+    filepath = bpy.path.abspath(node.image.filepath)
+    materializer = materialize.get_materializer()
+    paths = [get_image_path(filepath, v) for v in sparse]
+    paths = [p for p in paths if not os.path.exists(p) and not materializer.is_pending(p)]
+    if not paths:
+        return
+    width, height, is_float, base = read_image_pixels(get_template(filepath))
+    if is_float:
+        return
+    for path in paths:
+        materializer.compose_sparse(path, base)
+
+def release_loose_files(limit=materialize.MAX_LOOSE_FILES):
+    """Removes loose files of packed and sparse keys, which have not been displayed for a while."""
+    materializer = materialize.get_materializer()
+    if len(materializer.written) > limit:
+        materializer.release(get_dirty_paths(), limit)
+
+def get_dirty_paths() -> set:
+    """Returns the image files of all painted keys, their changes are only in memory."""
+    return {get_image_path(entry.image.filepath, v)
+        for entry in nodeindex.get_entries() if entry.image
+        for v in get_dirty_keys(entry.node)}
+
+def get_node_container(node: ShaderNodeTexImage):
+    """Returns the container of a packed sequence or None."""
+    if "ATC" not in node:
+        return None
+    dir, name, padding, ext = get_sequence_path_info(bpy.path.abspath(node.image.filepath))
+    return container.get_container(os.path.join(dir, container.get_container_name(name)))
+
+def materialize_keys(node: ShaderNodeTexImage, numbers, template=False) -> list:
+    """
+    Writes the missing image files of packed and sparse keys (and, with
+    `template`, the template). Returns the paths of the written files.
+    The key files are removed again, when they have not been displayed
+    for a while, the template stays for the links of lazy keys.
+    """
+    written = []
+    packed = get_node_container(node)
+    if packed:
+        dir, name, padding, ext = get_sequence_path_info(bpy.path.abspath(node.image.filepath))
+        lazy = get_lazy_keys(node)
+        files = [name + str(v).zfill(padding) + ext for v in set(numbers).difference(lazy)]
+        template_name = get_template(name + "0" * padding + ext)
+        if template or lazy.intersection(numbers):
+            files.append(template_name)
+        written += materialize.extract_packed(packed, dir, files)
+        for v in lazy.intersection(numbers):
+            path = os.path.join(dir, name + str(v).zfill(padding) + ext)
+            if not os.path.lexists(path) and fileops.link_lazy(
+                    os.path.join(dir, template_name), path):
+                written.append(path)
+        materialize.get_materializer().record(
+            p for p in written if os.path.basename(p) != template_name)
+    return written + compose_sparse_keys(node, numbers)
+
+def write_loose_keys(node: ShaderNodeTexImage, numbers) -> list:
+    """
+    Writes packed and sparse keys (and the template) as loose files, which
+    are kept, e.g. to render without the addon. Returns the written paths.
+    """
+    written = materialize_keys(node, numbers, template=True)
+    materialize.get_materializer().forget(written)
+    return written
+
+def store_keys(node: ShaderNodeTexImage, numbers):
+    """Records written image files in the index and adds them to the container of packed sequences."""
+    dir, name, padding, ext = get_sequence_path_info(bpy.path.abspath(node.image.filepath))
+    names = [name + str(v).zfill(padding) + ext for v in numbers]
+    seqindex.record_files(dir, names)
+    if stats.enabled:
+        index = seqindex.get_index(dir)
+        stats.add_bytes("written", sum(index.entries[n][0] for n in names if n in index.entries))
+    materializer = materialize.get_materializer()
+    packed = get_node_container(node)
+    if packed:
+        paths = [os.path.join(dir, name + str(v).zfill(padding) + ext)
+            for v in set(numbers).difference(get_lazy_keys(node))]
+        packed.put_files(paths)
+        # the saved files are in the container, the loose copies are temporary
+        materializer.record(paths)
+    else:
+        # saved keys (of sparse keys) can not be recreated, they are not removed
+        materializer.forget(os.path.join(dir, n) for n in names)
+
+def pack_keys(node: ShaderNodeTexImage, keyframe_points) -> int:
+    """
+    Moves the template and the image files of all keys into a single
+    container file. Lazy and sparse keys stay as they are. Returns the
+    number of packed files.
+    """
+    dir, name, padding, ext = get_sequence_path_info(bpy.path.abspath(node.image.filepath))
+    skip = get_lazy_keys(node).union(get_sparse_keys(node))
+    numbers = {int(k.co.y) for k in keyframe_points}.difference(skip)
+    files = [get_template(name + "0" * padding + ext)] + [
+        name + str(v).zfill(padding) + ext for v in sorted(numbers)]
+    files = [f for f in files if os.path.exists(os.path.join(dir, f))]
+    container.pack(os.path.join(dir, container.get_container_name(name)), dir, files)
+    node["ATC"] = True
+
+    index = seqindex.get_index(dir)
+    for file in files:
+        os.remove(os.path.join(dir, file))
+        index.remove(file)
+    index.write()
+    return len(files)
+
+def unpack_keys(node: ShaderNodeTexImage, keyframe_points) -> int:
+    """Writes all packed files as a plain image sequence and removes the container."""
+    packed = get_node_container(node)
+    if not packed:
+        return 0
+    dir, name, padding, ext = get_sequence_path_info(bpy.path.abspath(node.image.filepath))
+    written = container.unpack(packed.path, dir)
+    packed.close()
+    os.remove(packed.path)
+    del node["ATC"]
+    # the loose files are permanent now
+    materializer = materialize.get_materializer()
+    materializer.forget([p for p in list(materializer.written)
+        if os.path.dirname(p) == dir and os.path.basename(p).startswith(name)])
+    seqindex.record_files(dir, [os.path.basename(p) for p in written])
+    return len(written)
+
+def get_dirty_keys(node: ShaderNodeTexImage) -> set:
+    """Returns the image numbers of keys, which were painted since the last save."""
+    return get_number_set(node, "ATD")
+
+def set_dirty_keys(node: ShaderNodeTexImage, numbers):
+    set_number_set(node, "ATD", numbers)
+
+# the displayed key of a node: {node pointer => [image number, image was dirty
+# when it was displayed, a depsgraph update has been seen since, painted since
+# the last snapshot]}
+painted_state = {}
+
+def set_displayed_key(node: ShaderNodeTexImage, number: int):
+    """Remembers the key, which is displayed from now on (call before switching)."""
+    if node.as_pointer() in painted_state:
+        mark_dirty_key(node)
+    painted_state[node.as_pointer()] = [number, bool(node.image and node.image.is_dirty),
+        False, False]
+
+def reset_painted_state(node: ShaderNodeTexImage):
+    """Called after the keys of a node have been saved."""
+    state = painted_state.get(node.as_pointer())
+    if state:
+        # a background save leaves the image dirty
+        state[1] = bool(node.image.is_dirty)
+        state[3] = False
+
+def mark_dirty_key(node: ShaderNodeTexImage, painted: bool = False):
+    """
+    Marks the displayed key as dirty, if it has been painted. Image.is_dirty
+    covers the whole sequence, so it only tells, that the displayed key was
+    painted, if the image was clean when the key was displayed. Otherwise
+    only `painted` (a depsgraph update of the image) marks the key.
+    """
+    if not node or not node.image or not node.image.is_dirty:
+        return
+    state = painted_state.get(node.as_pointer())
+    if state is None:
+        if "ATK" not in node:
+            return
+        # displayed before the tracking started, e.g. when the file was loaded
+        state = painted_state[node.as_pointer()] = [int(node["ATK"]), False, False, False]
+    number, was_dirty, settled, changed = state
+    if was_dirty and not painted:
+        return
+    dirty = get_dirty_keys(node)
+    if number not in dirty:
+        dirty.add(number)
+        set_dirty_keys(node, dirty)
+        state[3] = True
+    elif painted:
+        state[3] = True
+
+def depsgraph_mark_dirty_key(node: ShaderNodeTexImage):
+    """
+    Marks the displayed key on image updates. The first update after the
+    key was switched may come from the switch itself and is skipped.
+    """
+    if not node:
+        return
+    state = painted_state.get(node.as_pointer())
+    if state and not state[2]:
+        state[2] = True
+        return
+    mark_dirty_key(node, painted=True)
+
+def snapshot_dirty_key(node: ShaderNodeTexImage):
+    """
+    Copies the pixels of the displayed key for the background save, if it
+    has been painted since the last copy.
+    """
+    if not node or not node.image:
+        return
+    state = painted_state.get(node.as_pointer())
+    if not state or not state[3]:
+        return
+    state[3] = False
+    number = state[0]
+    encoder.take_snapshot(node.image, number,
+        get_image_path(node.image.filepath, number))
+
+def unlink_lazy_keys(node: ShaderNodeTexImage, numbers=None):
+    """
+    Removes the template links of lazy keys (restricted to `numbers`),
+    so that saving writes new files instead of writing into the template.
+    """
+    if not node.image:
+        return
+    # relative paths would remove nothing and saving would write into the template
+    filepath = bpy.path.abspath(node.image.filepath)
+    dir, name, padding, ext = core.get_sequence_path_info(filepath)
+    lazy = get_lazy_keys(node)
+    if numbers is not None:
+        lazy = lazy.intersection(numbers)
+    for v in lazy:
+        fileops.remove_existing(os.path.join(dir, name + str(v).zfill(padding) + ext))
+
+def relink_lazy_keys(node: ShaderNodeTexImage, numbers=None):
     """
+    Counterpart of `unlink_lazy_keys`. Lazy keys, which have been written
+    by a save, are materialised. All others are linked to the template again.
+    """
+    if not node.image:
+        return
+    filepath = bpy.path.abspath(node.image.filepath)
+    dir, name, padding, ext = core.get_sequence_path_info(filepath)
+    template = get_template(filepath)
+    if not os.path.exists(template):
+        print("animtexture: Lazy keys can not be linked, the template is missing:", template)
+        return
+    lazy = get_lazy_keys(node)
+    materialised = []
+    for v in (lazy if numbers is None else lazy.intersection(numbers)):
+        path = os.path.join(dir, name + str(v).zfill(padding) + ext)
+        if os.path.lexists(path) or not fileops.link_lazy(template, path):
+            materialised.append(v)
+    if materialised:
+        set_lazy_keys(node, lazy.difference(materialised))
+
+
+class AnimtextureSequence():
+    """References to an animtexture node, its image and its keyframes."""
+    def __init__(self,
+            image: Image,
+            node: Node,
+            keyframes: FCurveKeyframePoints) -> None:
+        self.image = image
+        self.node = node
+        self.keyframes = keyframes
+
+
+def get_sequences(context, all_nodes: bool) -> List[AnimtextureSequence]:
+    """Returns the active animtexture node (or all of them) with keyframes."""
+    restore_full_images()
+    images = []
+    if all_nodes:
+        for entry in nodeindex.get_entries():
+            images.append(AnimtextureSequence(entry.image, entry.node, entry.keyframes))
+    else:
+        node_tree = get_active_node_tree(context)
+        node = get_active_SNTI(node_tree)
+        keys = get_keyframes_of_SNTI(node_tree, node)
+        if len(keys) > 0:
+            images.append(AnimtextureSequence(node.image, node, keys))
+    return images
+
+
+def save_sequence(context, img: AnimtextureSequence, editor: 'ImageEditorOverride'):
+    """Saves the painted keys of a sequence. Returns an error message or None."""
+    if not img.image:
+        return img.node.name + " - node has no texture selected."
+    if img.image.source != "SEQUENCE":
+        return img.image.name + " - is no image sequence."
+
+    i = img.image
+    absfilepath = bpy.path.abspath(i.filepath)
     dir, name, padding, ext = get_sequence_path_info(absfilepath)
-    key_values = [int(k.co.y) for k in keyframe_points]
-    def create_path(i):
-        return os.path.join(dir, name + str(i).zfill(padding) + ext)
-    required_files = [name + str(y).zfill(padding) + ext for y in key_values]
-    required_files.append(get_template(name + "0" * padding + ext))
-
-    for file in os.listdir(dir):
-        if file not in required_files:
-            os.remove(os.path.join(dir, file))
-            
-    # reassigns keyframes to start from 0 consecutively 
-    # [10, 12, 10, 20] => [0, 1, 0, 2]
-    # with a lookup { 10=>0, 12=>1, 20=>2}
-    transfer = dict()
-    i = 0
-    for k in keyframe_points:
-        v = int(k.co.y)
-        if v not in transfer:
-            transfer[v] = i
-            i += 1
-        # change keyframe values to match new image numbers    
-        k.co.y = transfer[v]
-        if transfer[v] == v:
-            del transfer[v]
-    
-    # Rename the image files to the new consecutive naming (stored in
-    # the "transfer" lookup). Solve renaming conflicts by adding the
-    # suffix "d" and the paths are stored in "duplicate". Remove all
-    # "d"-suffices from file names.
-    duplicate = []
-    for orig_index in transfer:
-        new_index = transfer[orig_index]
-        a = create_path(orig_index)
-        b = create_path(new_index)
-        
-        if new_index in transfer:
-            b += "d"
-            duplicate.append(b)
-        os.rename(a, b)
-    for d in duplicate:
-        os.rename(d, d[:-1])
-    return i
+    if not os.path.exists(dir):
+        return i.name
+
+    # save image sequence, blender only writes modified frames
+    mark_dirty_key(img.node)
+    dirty = get_dirty_keys(img.node)
+    if dirty:
+        image_editor, override = editor.get()
+        image_editor.spaces.active.image = i
+        unlink_lazy_keys(img.node, dirty)
+        bpy.ops.image.save_sequence(override)
+        relink_lazy_keys(img.node, dirty)
+        set_dirty_keys(img.node, [])
+        reset_painted_state(img.node)
+        for v in get_sparse_keys(img.node).intersection(dirty):
+            fileops.remove_existing(tiles.get_sparse_path(dir, name + str(v).zfill(padding) + ext))
+        set_sparse_keys(img.node, get_sparse_keys(img.node).difference(dirty))
+        for v in dirty:
+            encoder.snapshots.pop((i.name, v), None)
+
+        # rehash (and pack) the files which have been written
+        store_keys(img.node, dirty)
+
+    # delete unused (left over) images
+    factor = get_proxy_factor(img.node)
+    reorganize = context.preferences.addons[__package__].preferences.reorganizeOnSave
+    if reorganize:
+        clean_directory(img.keyframes, absfilepath, img.node)
+        # renumbered images invalidate all proxies
+        if factor:
+            shutil.rmtree(proxy.get_proxy_dir(dir, factor), ignore_errors=True)
+
+    # update the proxies of the written images in the background
+    if factor and (dirty or reorganize):
+        start_proxy_workers(img.node, factor)
+    return None
+
+
+class ImageEditorOverride():
+    """Sets up an image editor override on first use, restores the layout afterwards."""
+    def __init__(self, context: Context) -> None:
+        self.context = context
+        self.area = None
+        self.override = None
+        self.restore_callback = None
+
+    def get(self):
+        if not self.area:
+            self.area, self.restore_callback = get_image_editor(self.context)
+            self.override = self.context.copy()
+            self.override['area'] = self.area
+        return self.area, self.override
+
+    def restore(self):
+        if self.restore_callback:
+            self.restore_callback()
 
 
 def get_image_editor(context: Context):
@@ -805,11 +1592,7 @@ def get_image_editor(context: Context):
 
 def get_sequence_path_info(path: str) -> Tuple[str, int, str]:
     """Returns: directory, name, padding, extension(with a leading dot)."""
-    absfilepath = bpy.path.abspath(path)
-    dir = os.path.dirname(absfilepath)
-    name, ext = os.path.splitext(os.path.basename(absfilepath))
-    stripped_name = name.rstrip(string.digits)
-    return dir, stripped_name, len(name) - len(stripped_name), ext
+    return core.get_sequence_path_info(bpy.path.abspath(path))
 
 
 def attach_action_if_needed(tree:NodeTree):
@@ -867,7 +1650,7 @@ def animtexturekey_set(self, value):
     """Setter for SNTI attribute `animtexturekey`."""
     if "ATK" not in self or self["ATK"] != value:
         self["ATK"] = value
-        update_texture_from_image_number(self, value, bpy.context.scene.frame_current)
+        request_texture_update(self, value)
         
 
 def get_animkeydatapath(node_name:string)->string:
@@ -894,6 +1677,8 @@ def update_texture(context):
         return
     tree = get_active_node_tree(context)
     node = get_active_SNTI(tree)
+    if not node:
+        return
 
     #if node: update_node_color(node)
 
@@ -906,30 +1691,193 @@ def update_texture(context):
     if not crv:
         return
 
-    # image_number_0 = int(crv.evaluate(frame))
-    image_number = node.animtexturekey
-    update_texture_from_image_number(node, image_number, context.scene.frame_current)
+    frame = context.scene.frame_current
+    image_number = keyframes.get_index(crv).image_at(frame)
+    if image_number is None:
+        return
+    request_texture_update(node, image_number)
+
+
+PROXY_FACTORS = {'NONE': 0, 'HALF': 2, 'QUARTER': 4}
+# nodes, which show a proxy: {node pointer => (node, full resolution image)}
+proxy_images = {}
+# running background proxy builds
+proxy_processes = []
+
+def get_proxy_factor(node: ShaderNodeTexImage) -> int:
+    return PROXY_FACTORS[node.animtextureproxy]
+
+def start_proxy_workers(node: ShaderNodeTexImage, factor: int) -> list:
+    """Builds missing and outdated proxies of a node in the background."""
+    global proxy_processes
+    dir, name, padding, ext = get_sequence_path_info(node.image.filepath)
+    index = seqindex.get_index(dir)
+    index.refresh(rehash=False)
+    names = [n for n in index.names()
+        if n.startswith(name) and n[len(name):len(name) + padding].isdigit()
+            and len(n) == len(name) + padding + len(ext) and n.endswith(ext)]
+    processes = proxy.start_workers(bpy.app.binary_path, dir,
+        proxy.outdated(dir, names, factor), factor)
+    proxy_processes = [p for p in proxy_processes if p.poll() is None] + processes
+    return processes
+
+def get_proxy_image(image: Image, factor: int):
+    """Returns (and loads) the proxy image sequence of an image."""
+    name = image.name + ".proxy" + str(100 // factor)
+    img = bpy.data.images.get(name)
+    if img:
+        return img
+    dir, _, _, _ = get_sequence_path_info(image.filepath)
+    path = os.path.join(proxy.get_proxy_dir(dir, factor),
+        os.path.basename(bpy.path.abspath(image.filepath)))
+    if not os.path.exists(path):
+        return None
+    img = bpy.data.images.load(path)
+    img.name = name
+    img.alpha_mode = image.alpha_mode
+    img.source = 'SEQUENCE'
+    return img
+
+def activate_proxies():
+    """Shows the proxies of all nodes, which have one, during playback."""
+    for entry in nodeindex.get_entries():
+        node = entry.node
+        factor = get_proxy_factor(node)
+        if not factor or not node.image or node.as_pointer() in proxy_images:
+            continue
+        img = get_proxy_image(node.image, factor)
+        if img:
+            proxy_images[node.as_pointer()] = (node, node.image)
+            node.image = img
+    displayed_numbers.clear()
+
+def restore_full_images():
+    """Shows the full resolution images again."""
+    for node, image in proxy_images.values():
+        try:
+            node.image = image
+        except ReferenceError:
+            pass
+    if proxy_images:
+        proxy_images.clear()
+        displayed_numbers.clear()
+
+def is_playing() -> bool:
+    wm = bpy.context.window_manager
+    return any(w.screen and w.screen.is_animation_playing for w in wm.windows)
+
+def watch_playback():
+    """Timer, which restores the full resolution when the playback stops."""
+    if is_playing():
+        return 0.2
+    restore_full_images()
+    if bpy.context.object:
+        update_texture(bpy.context)
+    return None
+
+
+def prefetch_keys(context, node: ShaderNodeTexImage):
+    """Reads the files of the next keys on a background thread."""
+    preferences = context.preferences.addons[__package__].preferences
+    if not preferences.prefetchCount or not node or not node.image:
+        return
+    tree = get_active_node_tree(context)
+    if not tree.animation_data or not tree.animation_data.action:
+        return
+    crv = tree.animation_data.action.fcurves.find(get_animkeydatapath(node.name))
+    if not crv:
+        return
+    index = keyframes.get_index(crv)
+    frame = context.scene.frame_current
+    numbers = index.upcoming(frame, preferences.prefetchCount)
+    # playback loops back to the start of the scene
+    if len(numbers) < preferences.prefetchCount:
+        numbers += [n for n in index.upcoming(context.scene.frame_start - 1,
+                preferences.prefetchCount) if n not in numbers]
+        numbers = numbers[:preferences.prefetchCount]
+    prefetch_sparse_keys(node, numbers)
+    prefetcher = prefetch.get_prefetcher(preferences.prefetchBudget * 2**20)
+    prefetcher.request(get_image_path(node.image.filepath, n) for n in numbers)
+
+
+def set_image_user(image_user, image_number):
+    """
+    Shows `image_number` independent of the current frame: a cyclic
+    duration of 1 maps every frame to the first image, the offset selects
+    the image number. The values only change, when the image number does.
+    """
+    image_user.frame_start = 1
+    image_user.frame_duration = 1
+    image_user.use_cyclic = True
+    image_user.frame_offset = image_number - 1
 
 
-def update_texture_from_image_number(node: ShaderNodeTexImage, image_number, frame):
-    """Update the displayed texture, based on the current frame."""
-    frame_offset = image_number - frame
-    duration = max(frame, 1)
-    node.image_user.frame_duration = duration
-    node.image_user.frame_offset = frame_offset
-    
-    update_display_texture_imageeditor(node.image, duration, frame_offset)
+# image number, which is displayed by a node: {node pointer => (number, editors generation)}
+displayed_numbers = {}
+# updates, which are postponed while scrubbing: {node pointer => (node, number)}
+pending_updates = {}
+SCRUB_INTERVAL = 0.05
+last_scrub_update = 0.0
 
+def request_texture_update(node: ShaderNodeTexImage, image_number):
+    """
+    Updates the displayed texture, if the image number changed. While the
+    timeline is scrubbed, updates are coalesced to one per SCRUB_INTERVAL,
+    so only the keys which are actually shown get decoded.
+    """
+    global last_scrub_update
+    key = node.as_pointer()
+    if displayed_numbers.get(key) == (image_number, editors.generation):
+        pending_updates.pop(key, None)
+        return
 
-def update_display_texture_imageeditor(image, duration, offset):
+    screen = bpy.context.screen
+    if screen and getattr(screen, "is_scrubbing", False):
+        now = time.monotonic()
+        if now - last_scrub_update < SCRUB_INTERVAL:
+            if not pending_updates:
+                bpy.app.timers.register(apply_pending_updates,
+                    first_interval=SCRUB_INTERVAL)
+            pending_updates[key] = (node, image_number)
+            return
+        last_scrub_update = now
+    pending_updates.pop(key, None)
+    update_texture_from_image_number(node, image_number)
+
+def apply_pending_updates():
+    """Timer callback, applies the newest postponed update of every node."""
+    updates = list(pending_updates.values())
+    pending_updates.clear()
+    for node, image_number in updates:
+        try:
+            update_texture_from_image_number(node, image_number)
+        except ReferenceError:
+            pass
+    return None
+
+
+def update_texture_from_image_number(node: ShaderNodeTexImage, image_number):
+    """Update the displayed texture."""
+    state = painted_state.get(node.as_pointer())
+    if not state or state[0] != image_number:
+        set_displayed_key(node, image_number)
+    # packed and sparse keys are written, when they are displayed
+    if "ATS" in node or "ATC" in node:
+        materialize_keys(node, [image_number])
+        materialize.get_materializer().touch(
+            get_image_path(node.image.filepath, image_number))
+        release_loose_files()
+    set_image_user(node.image_user, image_number)
+    update_display_texture_imageeditor(node.image, image_number)
+    displayed_numbers[node.as_pointer()] = (image_number, editors.generation)
+
+
+def update_display_texture_imageeditor(image, image_number):
     """Update image sequence in image editor."""
-    for screen in bpy.data.screens:
-        for area in screen.areas:
-            if area.type != 'IMAGE_EDITOR':
-                continue
-            if area.spaces.active.image == image:
-                area.spaces.active.image_user.frame_duration = duration
-                area.spaces.active.image_user.frame_offset = offset
+    if not image:
+        return
+    for space in editors.get_spaces(image):
+        set_image_user(space.image_user, image_number)
     
 
 def path_exists(path):
@@ -941,16 +1889,127 @@ def path_exists(path):
 def onion_create_nodes(node_tree: ShaderNodeTree):
     for name in ["ONION_PREV", "ONION_NEXT"]:
         if node_tree.nodes.find(name) == -1:
-            node = node_tree.nodes.new('ShaderNodeTextureImage')
+            node = node_tree.nodes.new('ShaderNodeTexImage')
             node.name = name
+            node.label = name
+            node.hide = True
+    for name in ["ONION_MIX_PREV", "ONION_MIX_NEXT"]:
+        if node_tree.nodes.find(name) == -1:
+            node = node_tree.nodes.new('ShaderNodeMixRGB')
+            node.name = name
+            node.label = name
+            node.hide = True
 
 def onion_get_nodes(node_tree: ShaderNodeTree):
     return node_tree.nodes.get("ONION_PREV"), node_tree.nodes.get("ONION_NEXT")
 
+def onion_get_mix_nodes(node_tree: ShaderNodeTree):
+    return node_tree.nodes.get("ONION_MIX_PREV"), node_tree.nodes.get("ONION_MIX_NEXT")
+
+# {node tree pointer => (node name, paths and stamps of the ghosts)}
+onion_state = {}
+
+def onion_enable(node_tree: ShaderNodeTree, node: ShaderNodeTexImage):
+    """
+    Mixes the ghosts of the previous and next key over the color of `node`.
+    Only one node of a node tree has onion skins.
+    """
+    if "ATO" in node_tree:
+        onion_disable(node_tree)
+    onion_create_nodes(node_tree)
+    prev, next = onion_get_nodes(node_tree)
+    mix_prev, mix_next = onion_get_mix_nodes(node_tree)
+    x, y = node.location
+    prev.location = (x, y - 300)
+    next.location = (x, y - 350)
+    mix_prev.location = (x + 300, y)
+    mix_next.location = (x + 300, y - 50)
+
+    # the mix nodes are inserted between the color output and its targets
+    links = node_tree.links
+    color = node.outputs['Color']
+    targets = [link.to_socket for link in links if link.from_socket == color]
+    for socket in targets:
+        links.new(mix_next.outputs['Color'], socket)
+    links.new(color, mix_prev.inputs[1])
+    links.new(mix_prev.outputs['Color'], mix_next.inputs[1])
+    for ghost, mix in [(prev, mix_prev), (next, mix_next)]:
+        links.new(ghost.outputs['Alpha'], mix.inputs[0])
+        links.new(ghost.outputs['Color'], mix.inputs[2])
+    node_tree["ATO"] = node.name
+    onion_state.pop(node_tree.as_pointer(), None)
+
+def onion_disable(node_tree: ShaderNodeTree):
+    """Removes the onion skin nodes and restores the links of the animtexture node."""
+    node = node_tree.nodes.get(node_tree.get("ATO", ""))
+    mix_prev, mix_next = onion_get_mix_nodes(node_tree)
+    if node and mix_next:
+        links = node_tree.links
+        targets = [link.to_socket for link in links
+            if link.from_socket == mix_next.outputs['Color']]
+        for socket in targets:
+            links.new(node.outputs['Color'], socket)
+    for n in list(onion_get_nodes(node_tree)) + [mix_prev, mix_next]:
+        if not n:
+            continue
+        if n.type == 'TEX_IMAGE' and n.image and n.image.users <= 1:
+            bpy.data.images.remove(n.image)
+        node_tree.nodes.remove(n)
+    if "ATO" in node_tree:
+        del node_tree["ATO"]
+    onion_state.pop(node_tree.as_pointer(), None)
+
+def onion_set_ghost(ghost_node: ShaderNodeTexImage, ghost):
+    """Writes the ghost pixels into the image of an onion node."""
+    width, height, is_float, pixels = ghost
+    img = ghost_node.image
+    if (not img or tuple(img.size) != (width, height)
+            or img.is_float != is_float):
+        if img and img.users <= 1:
+            bpy.data.images.remove(img)
+        img = bpy.data.images.new(ghost_node.name, width, height,
+            alpha=True, float_buffer=is_float)
+        ghost_node.image = img
+    img.pixels.foreach_set(pixels)
+    img.update()
+
+def onion_update(entry: nodeindex.AnimtextureNode, frame: int):
+    """
+    Shows the ghosts of the keys before and after the key at `frame`.
+    Ghosts are only written, when the neighbouring keys (or their files) changed.
+    """
+    tree, node = entry.tree, entry.node
+    mixes = onion_get_mix_nodes(tree)
+    if not node.image or not all(mixes):
+        return
+    previous, next = keyframes.get_index(entry.fcurve).neighbours(frame)
+    materialize_keys(node, [n for n in [previous, next] if n is not None])
+    paths = [None if n is None else get_image_path(bpy.path.abspath(node.image.filepath), n)
+        for n in [previous, next]]
+    state = (node.name, [(p, onion.get_stamp(p)) for p in paths if p])
+    if onion_state.get(tree.as_pointer()) == state:
+        return
+    onion_state[tree.as_pointer()] = state
+
+    opacity = bpy.context.preferences.addons[__package__].preferences.onionOpacity
+    for ghost_node, mix, path, tint in zip(onion_get_nodes(tree), mixes, paths,
+            [onion.PREV_TINT, onion.NEXT_TINT]):
+        ghost = path and onion.ghosts.get(path, tint, opacity, read_image_pixels)
+        # a muted mix node passes the color through
+        mix.mute = not ghost
+        if ghost:
+            onion_set_ghost(ghost_node, ghost)
+
+def onion_update_all(scene):
+    for entry in nodeindex.get_entries():
+        if entry.tree.get("ATO") == entry.node.name:
+            onion_update(entry, scene.frame_current)
+
 owners = []
 
 
 def msgbus_callback(node, node_tree, owner):
+    nodeindex.invalidate()
     if get_keyframes_of_SNTI(node_tree,node):
        update_node_color(node)
     else:
@@ -969,76 +2028,171 @@ def msgbus_subscribe_to(node, node_tree):
     )
 
 @persistent
+@stats.timed("framechange")
 def animtexture_framechange(scene):
+    # remember painted keys, before another key is displayed
+    if bpy.context.object:
+        node = get_active_SNTI(get_active_node_tree(bpy.context))
+        mark_dirty_key(node)
+        if bpy.context.preferences.addons[__package__].preferences.asyncSave:
+            snapshot_dirty_key(node)
+        prefetch_keys(bpy.context, node)
+    # viewport playback uses the proxies
+    if not proxy_images and is_playing():
+        activate_proxies()
+        if proxy_images:
+            bpy.app.timers.register(watch_playback, first_interval=0.2)
     update_texture(bpy.context)
+    onion_update_all(scene)
     
 
 @persistent
+def animtexture_proxy_restore(*args):
+    """Renders and saves always use the full resolution."""
+    restore_full_images()
+
+
+@persistent
+@stats.timed("depsgraph_update")
+def animtexture_depsgraph_update(scene, depsgraph):
+    """Invalidates cached keyframe lookups when actions change.
+    Tracks painted keys."""
+    if depsgraph.id_type_updated('ACTION'):
+        keyframes.invalidate()
+    nodeindex.depsgraph_update(depsgraph)
+    if bpy.context.object:
+        node = get_active_SNTI(get_active_node_tree(bpy.context))
+        if depsgraph.id_type_updated('IMAGE'):
+            depsgraph_mark_dirty_key(node)
+        elif node and node.as_pointer() in painted_state:
+            painted_state[node.as_pointer()][2] = True
+
+
+@persistent
+@stats.timed("loadpre")
 def animtexture_loadpre(scene):
-    """Checks if image files, that are connected to animtexture keyframes, are missing at startup.
-    Shows a popup panel to display errors.
+    """Removes the loose files of packed and sparse keys of the closed file.
     Update textures."""
-    errors = {}
-    for mat in bpy.data.materials:
-        if (    not mat.use_nodes or
-                not mat.node_tree.animation_data or
-                not mat.node_tree.animation_data.action):
+    materialize.get_materializer().release((), 0)
+    update_texture(bpy.context)
+    bpy.context.view_layer.update()
+
+
+# report of the last link check: [{"node", "path", "missing", "empty"}]
+checklinks_report = []
+# file names per node and problem in the popup
+MAX_REPORTED_FILES = 5
+
+def get_checklinks_sequences():
+    """Returns the node labels and the (absfilepath, key_values, sparse, lazy) of all sequences."""
+    labels = []
+    sequences = []
+    for entry in nodeindex.get_entries():
+        node = entry.node
+        if not node.image or node.image.source != 'SEQUENCE':
             continue
-        for node in mat.node_tree.nodes:
-            keys = get_keyframes_of_SNTI(mat.node_tree, node)
-            if len(keys) == 0:
-                continue
-            if not node.image or node.image.source != 'SEQUENCE':
-                continue
+        co, key_values = get_key_values(entry.keyframes)
+        labels.append(entry.owner.name + ": " + node.name)
+        sequences.append((bpy.path.abspath(node.image.filepath), key_values,
+            get_sparse_keys(node), get_lazy_keys(node)))
+    return labels, sequences
 
-            dir, name, padding, ext = get_sequence_path_info(node.image.filepath)
-            if os.path.exists(dir):
-                indices = [int(key.co.y) for key in keys]
-                existingfiles= os.listdir(dir)
-                for index in indices:
-                    filename = name + str(index).zfill(padding) + ext
-                    if not filename in existingfiles:
-                        if node.name not in errors:
-                            errors[node.name] = []
-                        errors[node.name].append(filename)
-    if len(errors):
-        def draw(self, context):
-            col = self.layout.column()
-            for nodename, imagenumbers in errors.items():
-                col.label(text=nodename + str(imagenumbers))
-
-        bpy.context.window_manager.popup_menu(draw, title = "Animtexture: There are files missing:", icon='ERROR')   
+def show_checklinks_report():
+    def draw(self, context):
+        col = self.layout.column()
+        for item in checklinks_report:
+            for msg in ["missing", "empty"]:
+                if item[msg]:
+                    col.label(text="{} ({} {}): {}".format(item["node"], len(item[msg]), msg,
+                        ", ".join(item[msg][:MAX_REPORTED_FILES])
+                        + (" ..." if len(item[msg]) > MAX_REPORTED_FILES else "")))
+    bpy.context.window_manager.popup_menu(draw,
+        title="Animtexture: There are files missing or empty:", icon='ERROR')
 
-    update_texture(bpy.context)
-    bpy.context.view_layer.update()
+@persistent
+@stats.timed("checklinks")
+def animtexture_checklinks(scene):
+    """
+    Checks, that the image files of all animtexture keyframes exist and
+    are not empty. The directories are scanned in a background thread,
+    so opening files on slow shares is not blocked. A popup shows the
+    problems, `checklinks_report` holds them.
+    """
+    labels, sequences = get_checklinks_sequences()
+    checklinks_report.clear()
+    if not sequences:
+        return
+    result = {}
+    def check():
+        try:
+            result["reports"] = core.validate_all(sequences)
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=check, daemon=True, name="animtexture checklinks")
+    thread.start()
+
+    def finish():
+        if thread.is_alive():
+            return 0.2
+        if "error" in result:
+            print("animtexture: Could not check links:", result["error"])
+            return None
+        for label, (path, *rest), report in zip(labels, sequences, result["reports"]):
+            if report["missing"] or report["empty"]:
+                checklinks_report.append(dict(node=label, path=path, **report))
+        for item in checklinks_report:
+            print("animtexture: {node} ({path}) missing: {missing} empty: {empty}".format(**item))
+        if checklinks_report:
+            show_checklinks_report()
+        return None
+    bpy.app.timers.register(finish, first_interval=0.05)
 
 
 @persistent
+@stats.timed("loadpost")
 def animtexture_loadpost(scene):
     """Set color of node,
     Attach message bus handler to
     check if a valid image sequence is present."""
-    for mat in bpy.data.materials:
-        if (    not mat.use_nodes or
-                not mat.node_tree.animation_data or
-                not mat.node_tree.animation_data.action):
-            continue
-        for node in mat.node_tree.nodes:
-            keys = get_keyframes_of_SNTI(mat.node_tree, node)
-            if len(keys) == 0:
-                continue
+    nodeindex.invalidate()
+    recover_directories(nodeindex.get_entries())
+    for entry in nodeindex.get_entries():
+        update_node_color(entry.node)
+        msgbus_subscribe_to(entry.node, entry.tree)
+    keyframes.invalidate()
+    displayed_numbers.clear()
+    painted_state.clear()
+    onion_state.clear()
+    editors.subscribe()
 
-            update_node_color(node)
-            msgbus_subscribe_to(node, mat.node_tree)
+
+@persistent
+def animtexture_undo(scene):
+    """
+    Drops the caches, which are keyed by pointers and point counts.
+    Undo and redo can rebuild the datablocks, which makes them stale.
+    """
+    nodeindex.invalidate()
+    keyframes.invalidate()
+    displayed_numbers.clear()
+    painted_state.clear()
+    onion_state.clear()
 
 
 @persistent
+@stats.timed("savewithfile")
 def animtexture_savewithfile(empty):
     """
     make sure the image sequence is saved
     """
     # TODO find more elegant solution
     context = bpy.context
+    # nothing to do, if no animtexture image has unsaved changes and
+    # the directories are not reorganized
+    if (not context.preferences.addons[__package__].preferences.reorganizeOnSave
+            and not any(entry.image and entry.image.is_dirty
+                for entry in nodeindex.get_entries())):
+        return
     SAVE_ALL = context.preferences.addons[__package__].preferences.savewithfile == 'SAVE_ALL'
     bpy.ops.anim.animtexture_save(save_all=SAVE_ALL)
 
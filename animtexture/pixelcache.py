@@ -0,0 +1,125 @@
+"""
+On-disk cache of decoded pixels.
+
+Decoding PNG and EXR keys again, every time they are needed, is slow.
+The decoded RGBA float32 pixels are stored as .npy files, which are
+memory mapped on load and can be passed to `Image.pixels.foreach_set`
+without a copy. Entries are keyed by path, mtime and size of the image
+file, so changed files miss the cache. The least recently used entries
+are evicted, when the cache exceeds its size budget. Does not depend on bpy.
+"""
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# file name suffix: float (EXR) and byte images
+SUFFIX_FLOAT = ".f.npy"
+SUFFIX_BYTE = ".b.npy"
+
+
+def get_key(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = "|".join([os.path.abspath(path), str(st.st_mtime_ns), str(st.st_size)])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class PixelCache():
+    """Directory of .npy files with LRU eviction: {key => (name, size)}."""
+
+    def __init__(self, directory: str, budget: int) -> None:
+        self.directory = directory
+        self.budget = budget
+        self.entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.size = 0
+        self.scan()
+
+    def scan(self):
+        """Reads the entries from the directory, ordered by their last use."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX_FLOAT) or entry.name.endswith(SUFFIX_BYTE):
+                    st = entry.stat()
+                    found.append((st.st_mtime_ns, entry.name, st.st_size))
+        self.entries.clear()
+        self.size = 0
+        for mtime, name, size in sorted(found):
+            self.entries[name[:-len(SUFFIX_FLOAT)]] = (name, size)
+            self.size += size
+
+    def get(self, path: str) -> Optional[Tuple[int, int, bool, np.ndarray]]:
+        """Returns width, height, is_float and the memory mapped pixels of the image file."""
+        key = get_key(path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        name, size = entry
+        file = os.path.join(self.directory, name)
+        try:
+            pixels = np.load(file, mmap_mode="r")
+            # the mtime orders the entries by use in the next session
+            os.utime(file)
+        except (OSError, ValueError):
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        height, width = pixels.shape[:2]
+        return width, height, name.endswith(SUFFIX_FLOAT), pixels.reshape(-1)
+
+    def put(self, path: str, width: int, height: int, is_float: bool, pixels: np.ndarray):
+        key = get_key(path)
+        if key is None:
+            return
+        name = key + (SUFFIX_FLOAT if is_float else SUFFIX_BYTE)
+        file = os.path.join(self.directory, name)
+        tmp = file + ".tmp"
+        # before writing, the old entry may have the same name
+        self.discard(key)
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, np.asarray(pixels, dtype=np.float32).reshape(height, width, 4))
+            os.replace(tmp, file)
+        except OSError as e:
+            print("animtexture: Could not write pixel cache", file, e)
+            return
+        size = os.path.getsize(file)
+        self.entries[key] = (name, size)
+        self.size += size
+        self.evict()
+
+    def discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        try:
+            os.remove(os.path.join(self.directory, entry[0]))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Removes the least recently used entries, until the cache fits its budget."""
+        while self.size > self.budget and len(self.entries) > 1:
+            self.discard(next(iter(self.entries)))
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
+
+
+_cache: Optional[PixelCache] = None
+
+
+def get_cache(directory: str, budget: int) -> PixelCache:
+    """Returns the pixel cache, which is shared by all sequences."""
+    global _cache
+    if _cache is None or _cache.directory != directory:
+        _cache = PixelCache(directory, budget)
+    _cache.budget = budget
+    return _cache
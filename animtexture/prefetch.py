@@ -0,0 +1,122 @@
+"""
+Read-ahead of upcoming key images during playback.
+
+A background thread reads the files of the next keys and discards the
+data, so they are in the cache of the operating system, when Blender
+decodes them, and Blender does not wait for disk or network. Only the
+names of the read files are kept, bounded by a byte budget, which
+should fit into the cache of the operating system.
+Does not depend on bpy.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+from . import stats
+
+READ_BUFFER = 2**20
+
+
+class ReadFiles():
+    """Thread safe LRU of the files, which have been read: {path => (size, mtime)}."""
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.size = 0
+        self.items: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def contains(self, path: str) -> bool:
+        """True, if the file was read. Does not touch the file system, it runs per frame."""
+        with self.lock:
+            if path not in self.items:
+                return False
+            self.items.move_to_end(path)
+            return True
+
+    def put(self, path: str, stamp: tuple):
+        with self.lock:
+            old = self.items.pop(path, None)
+            if old:
+                self.size -= old[0]
+            if stamp[0] > self.budget:
+                return
+            self.items[path] = stamp
+            self.size += stamp[0]
+            while self.size > self.budget:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= evicted[0]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+def read_ahead(path: str, buffer: bytearray) -> tuple:
+    """Reads a file into the cache of the operating system, without keeping the data."""
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        view = memoryview(buffer)
+        while f.readinto(view):
+            pass
+    stats.add_bytes("read", st.st_size)
+    return st.st_size, st.st_mtime_ns
+
+
+class Prefetcher():
+    """Reads requested files on a background thread. Newer requests replace older ones."""
+
+    def __init__(self, budget: int) -> None:
+        self.cache = ReadFiles(budget)
+        self.pending = []
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True,
+            name="animtexture prefetch")
+        self.thread.start()
+
+    def request(self, paths: Iterable[str]):
+        paths = [p for p in paths if not self.cache.contains(p)]
+        with self.condition:
+            self.pending = paths
+            self.condition.notify()
+
+    def run(self):
+        buffer = bytearray(READ_BUFFER)
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                path = self.pending.pop(0)
+            try:
+                self.cache.put(path, read_ahead(path, buffer))
+            except OSError:
+                pass
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.cache.clear()
+
+
+_prefetcher: Optional[Prefetcher] = None
+
+def get_prefetcher(budget: int) -> Prefetcher:
+    """Returns the running prefetcher, adapts its memory budget."""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher(budget)
+    _prefetcher.cache.budget = budget
+    return _prefetcher
+
+def stop():
+    global _prefetcher
+    if _prefetcher is not None:
+        _prefetcher.stop()
+        _prefetcher = None
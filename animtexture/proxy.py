@@ -0,0 +1,75 @@
+"""
+Reduced resolution proxies of animtexture sequences for viewport playback.
+
+Proxies are stored next to the sequence in `proxy_50` / `proxy_25` with
+the same file names. They are built by a pool of background Blender
+processes, so that decoding and scaling does not block the interface.
+This file is also the script, which the background processes run:
+
+    blender -b --factory-startup --python proxy.py -- <factor> <directory> <files...>
+"""
+import os
+import sys
+import subprocess
+from typing import List
+
+FACTORS = (2, 4)
+
+
+def get_proxy_dir(dir: str, factor: int) -> str:
+    return os.path.join(dir, "proxy_" + str(100 // factor))
+
+
+def outdated(dir: str, names: List[str], factor: int) -> List[str]:
+    """Returns the names, whose proxy is missing or older than the image."""
+    proxy_dir = get_proxy_dir(dir, factor)
+    result = []
+    for name in names:
+        try:
+            source = os.stat(os.path.join(dir, name)).st_mtime_ns
+        except OSError:
+            continue
+        try:
+            if os.stat(os.path.join(proxy_dir, name)).st_mtime_ns >= source:
+                continue
+        except OSError:
+            pass
+        result.append(name)
+    return result
+
+
+def start_workers(blender: str, dir: str, names: List[str], factor: int,
+        workers: int = max(1, (os.cpu_count() or 2) // 2)) -> List[subprocess.Popen]:
+    """Starts background Blender processes, which build the proxies of `names`."""
+    if not names:
+        return []
+    proxy_dir = get_proxy_dir(dir, factor)
+    os.makedirs(proxy_dir, exist_ok=True)
+    workers = min(workers, len(names))
+    processes = []
+    for i in range(workers):
+        chunk = [os.path.join(dir, n) for n in names[i::workers]]
+        processes.append(subprocess.Popen(
+            [blender, "-b", "--factory-startup", "--python", os.path.abspath(__file__),
+                "--", str(factor), proxy_dir] + chunk,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes
+
+
+def build(factor: int, proxy_dir: str, paths: List[str]):
+    """Runs inside a background Blender: scales the images and saves them as proxies."""
+    import bpy
+    for path in paths:
+        img = bpy.data.images.load(path)
+        width, height = img.size
+        img.scale(max(width // factor, 1), max(height // factor, 1))
+        target = os.path.join(proxy_dir, os.path.basename(path))
+        img.filepath_raw = target + ".tmp"
+        img.save()
+        os.replace(target + ".tmp", target)
+        bpy.data.images.remove(img)
+
+
+if __name__ == "__main__":
+    args = sys.argv[sys.argv.index("--") + 1:]
+    build(int(args[0]), args[1], args[2:])
@@ -0,0 +1,173 @@
+"""
+Persistent sidecar index of a sequence directory.
+
+Stores filename, size, mtime and content hash of every file in a small
+json file next to the images. Files are only rehashed, if their size or
+mtime changed. Directories of others (e.g. import sources) get no sidecar,
+their index is kept in a cache directory. Does not depend on bpy.
+"""
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, List, Optional
+from . import dedup
+
+INDEX_NAME = ".animtexture_index.json"
+INDEX_VERSION = 1
+# indices of directories, which must not be written to
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+    os.path.join("~", ".cache")), "animtexture", "index")
+
+
+def get_cache_path(directory: str) -> str:
+    """Returns the path of the cached index of a directory without a sidecar."""
+    key = hashlib.sha1(os.path.normpath(os.path.abspath(directory)).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+class SequenceIndex():
+    """
+    Index of all files in `directory`: {name => [size, mtime_ns, digest]}.
+    Without `sidecar` it is stored in the cache directory instead of the
+    directory itself.
+    """
+
+    def __init__(self, directory: str, sidecar: bool = True) -> None:
+        self.directory = directory
+        self.sidecar = sidecar
+        self.entries: Dict[str, list] = {}
+        self.modified = False
+        self.read()
+
+    @property
+    def path(self) -> str:
+        if self.sidecar:
+            return os.path.join(self.directory, INDEX_NAME)
+        return get_cache_path(self.directory)
+
+    def read(self):
+        """Reads the index from disk. A missing or broken index is empty."""
+        paths = [self.path]
+        if not self.sidecar:
+            # an existing sidecar is used, but never written
+            paths.append(os.path.join(self.directory, INDEX_NAME))
+        self.entries = {}
+        for path in paths:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    self.entries = data["files"]
+                    return
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def write(self):
+        """Writes the index atomically, if it has been modified."""
+        if not self.modified or not os.path.isdir(self.directory):
+            return
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(tmp), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump({"version": INDEX_VERSION, "files": self.entries}, f)
+            os.replace(tmp, self.path)
+            self.modified = False
+        except OSError as e:
+            print("animtexture: Could not write index", self.path, e)
+
+    def refresh(self, rehash: bool = True):
+        """
+        Revalidates the index against the directory. Entries are only
+        invalidated, if size or mtime changed. With `rehash`, invalidated
+        entries are hashed again (in parallel).
+        """
+        found = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    found[entry.name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+
+        for name in [n for n in self.entries if n not in found]:
+            del self.entries[name]
+            self.modified = True
+        for name, (size, mtime) in found.items():
+            entry = self.entries.get(name)
+            if not entry or entry[0] != size or entry[1] != mtime:
+                self.entries[name] = [size, mtime, None]
+                self.modified = True
+        if rehash:
+            self.hash_missing()
+
+    def hash_missing(self, names: Optional[Iterable[str]] = None):
+        """Hashes entries without a digest (restricted to `names`)."""
+        if names is None:
+            names = self.entries.keys()
+        todo = [n for n in names
+            if n in self.entries and self.entries[n][2] is None]
+        if not todo:
+            return
+        paths = [os.path.join(self.directory, n) for n in todo]
+        digests = dedup.hash_files(paths)
+        for name, path in zip(todo, paths):
+            self.entries[name][2] = digests[path]
+        self.modified = True
+
+    def update(self, name: str, digest: Optional[str] = None):
+        """Records a file written by the addon. Hashes it, if `digest` is not given."""
+        path = os.path.join(self.directory, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove(name)
+            return
+        if digest is None:
+            digest = dedup.hash_file(path)
+        self.entries[name] = [st.st_size, st.st_mtime_ns, digest]
+        self.modified = True
+
+    def remove(self, name: str):
+        if self.entries.pop(name, None) is not None:
+            self.modified = True
+
+    def rename(self, old: str, new: str):
+        entry = self.entries.pop(old, None)
+        if entry is not None:
+            self.entries[new] = entry
+        else:
+            self.entries.pop(new, None)
+        self.modified = True
+
+    def names(self) -> List[str]:
+        return list(self.entries.keys())
+
+    def digest(self, name: str) -> Optional[str]:
+        """Returns the content hash of a file, hashing it if required."""
+        if name not in self.entries:
+            return None
+        if self.entries[name][2] is None:
+            self.hash_missing([name])
+        return self.entries[name][2]
+
+
+_indices: Dict[tuple, SequenceIndex] = {}
+
+def get_index(directory: str, sidecar: bool = True) -> SequenceIndex:
+    """Returns the (cached) index of a directory. See `SequenceIndex` for `sidecar`."""
+    directory = os.path.normpath(os.path.abspath(directory))
+    key = (directory, sidecar)
+    if key not in _indices:
+        _indices[key] = SequenceIndex(directory, sidecar)
+    return _indices[key]
+
+def record_files(directory: str, names: Iterable[str]):
+    """Updates the index of `directory` after the addon wrote `names`."""
+    index = get_index(directory)
+    for name in names:
+        index.update(name)
+    index.write()
@@ -0,0 +1,94 @@
+"""
+Opt-in timing of the handlers and operators of the addon.
+
+Counts calls and wall time per name and the bytes read, written and
+copied by the addon. Disabled, `timed` adds a single flag check per call.
+Enable it in the preferences or with the environment variable
+ANIMTEXTURE_STATS=1 and dump the numbers of a headless session:
+
+    blender -b shot.blend --python-expr "import animtexture.stats as s; s.dump('stats.json')"
+
+Does not depend on bpy.
+"""
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from typing import Dict
+
+# number of durations per name, which are kept for the percentile
+SAMPLES = 1000
+BYTE_KINDS = ("read", "written", "copied")
+
+enabled = os.environ.get("ANIMTEXTURE_STATS", "") not in ("", "0")
+_lock = threading.Lock()
+_calls: Dict[str, list] = {}
+_bytes: Dict[str, int] = {kind: 0 for kind in BYTE_KINDS}
+
+
+def record(name: str, duration: float):
+    with _lock:
+        entry = _calls.get(name)
+        if entry is None:
+            entry = _calls[name] = [0, 0.0, deque(maxlen=SAMPLES)]
+        entry[0] += 1
+        entry[1] += duration
+        entry[2].append(duration)
+
+
+def add_bytes(kind: str, count: int):
+    if not enabled:
+        return
+    with _lock:
+        _bytes[kind] += count
+
+
+def timed(name: str):
+    """Decorator, which records the calls of a function under `name`."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - t)
+        return wrapper
+    return decorator
+
+
+def percentile(samples, p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def report() -> dict:
+    """Returns {"calls": {name: {count, total, mean, p95}}, "bytes": {kind: count}} in seconds."""
+    with _lock:
+        calls = {name: {
+                "count": count,
+                "total": total,
+                "mean": total / count if count else 0.0,
+                "p95": percentile(samples, 0.95),
+                }
+            for name, (count, total, samples) in sorted(_calls.items())}
+        return {"calls": calls, "bytes": dict(_bytes)}
+
+
+def dump(path: str):
+    """Writes the report as json."""
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+def reset():
+    with _lock:
+        _calls.clear()
+        for kind in BYTE_KINDS:
+            _bytes[kind] = 0
@@ -0,0 +1,80 @@
+"""
+Tile-sparse storage of keys relative to the template.
+
+A sparse key stores only the tiles, which differ from the template, and
+their tile coordinates in a compressed .npz file. The full image is
+composed from the template and the tiles on demand.
+Pixels are flat float32 arrays like Image.pixels. Does not depend on bpy.
+"""
+import os
+import numpy as np
+from typing import Optional, Tuple
+
+TILE_SIZE = 64
+SPARSE_DIR = "sparse"
+# keys with more differing tiles are stored as full images
+MAX_TILE_RATIO = 0.5
+
+
+def get_sparse_path(dir: str, name: str) -> str:
+    """Returns the path of the sparse file of the image file `name`."""
+    return os.path.join(dir, SPARSE_DIR, os.path.splitext(name)[0] + ".npz")
+
+
+def to_tiles(pixels: np.ndarray, width: int, height: int, channels: int,
+        tile: int) -> np.ndarray:
+    """Returns an array of shape (rows, columns, tile, tile, channels), padded with zeros."""
+    rows, columns = -(-height // tile), -(-width // tile)
+    padded = np.zeros((rows * tile, columns * tile, channels), dtype=pixels.dtype)
+    padded[:height, :width] = pixels.reshape(height, width, channels)
+    return padded.reshape(rows, tile, columns, tile, channels).swapaxes(1, 2)
+
+
+def diff_tiles(base: np.ndarray, pixels: np.ndarray, width: int, height: int,
+        channels: int, tile: int = TILE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the coordinates (n, 2) and the data of the tiles, which differ from `base`."""
+    a = to_tiles(base, width, height, channels, tile)
+    b = to_tiles(pixels, width, height, channels, tile)
+    changed = (a != b).any(axis=(2, 3, 4))
+    coords = np.argwhere(changed).astype(np.int32)
+    return coords, b[changed]
+
+
+def is_sparse_worthy(coords: np.ndarray, width: int, height: int,
+        tile: int = TILE_SIZE) -> bool:
+    total = -(-height // tile) * -(-width // tile)
+    return len(coords) <= total * MAX_TILE_RATIO
+
+
+def save_sparse(path: str, coords: np.ndarray, data: np.ndarray,
+        width: int, height: int, channels: int, is_float: bool, tile: int = TILE_SIZE):
+    """Writes the tiles. 8 bit images are stored as bytes, without loss."""
+    if not is_float:
+        data = (data * 255.0 + 0.5).astype(np.uint8)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, coords=coords, data=data,
+        shape=np.array([width, height, channels, tile], dtype=np.int32))
+    os.replace(tmp, path)
+
+
+def load_sparse(path: str) -> Optional[dict]:
+    try:
+        with np.load(path) as f:
+            return {key: f[key] for key in f.files}
+    except (OSError, ValueError):
+        return None
+
+
+def compose(base: np.ndarray, sparse: dict) -> np.ndarray:
+    """Returns the full pixels: the template with the stored tiles applied."""
+    width, height, channels, tile = (int(v) for v in sparse["shape"])
+    data = sparse["data"]
+    if data.dtype == np.uint8:
+        data = data.astype(np.float32) / 255.0
+    tiles = to_tiles(base.astype(np.float32), width, height, channels, tile).copy()
+    if len(sparse["coords"]):
+        tiles[sparse["coords"][:, 0], sparse["coords"][:, 1]] = data
+    rows, columns = tiles.shape[:2]
+    full = tiles.swapaxes(1, 2).reshape(rows * tile, columns * tile, channels)
+    return np.ascontiguousarray(full[:height, :width]).reshape(-1)
@@ -1,4 +1,5 @@
 from . import ops
+from . import stats
 import bpy
 from bpy.app import handlers
 
@@ -10,6 +11,8 @@ from bpy.types import (
 from bpy.props import (
         BoolProperty,
         EnumProperty,
+        FloatProperty,
+        IntProperty,
         StringProperty,
         )
 
@@ -39,6 +42,10 @@ class VIEW3D_PT_animtexture(Panel):
         op.save_all = False
         op = row.operator("anim.animtexture_save", text="Save All", icon="FILE")
         op.save_all = True
+        if context.preferences.addons[__package__].preferences.asyncSave:
+            row = col.row()
+            op = row.operator("anim.animtexture_save_async", text="Save All (Background)", icon="FILE")
+            op.save_all = True
         
         
         if not tex:
@@ -47,6 +54,10 @@ class VIEW3D_PT_animtexture(Panel):
             col.row().label(text="")
 
         if tex:
+            row = col.row()
+            row.prop(tex, "animtextureproxy", expand=True)
+            row.operator("anim.animtexture_proxy", text="", icon="FILE_REFRESH")
+
             # DEBUGGING
             if False:
                 row = col.row()
@@ -63,6 +74,50 @@ class VIEW3D_PT_animtexture(Panel):
         row.operator("anim.animtexture_insert", icon="KEY_HLT")
         row.operator("anim.animtexture_duplicate", icon="KEY_HLT")
 
+        row = col.row()
+        row.operator("anim.animtexture_onion", icon="ONIONSKIN_ON")
+
+        row = col.row()
+        op = row.operator("anim.animtexture_container", text="Pack Container")
+        op.unpack = False
+        op = row.operator("anim.animtexture_container", text="Unpack")
+        op.unpack = True
+
+        row = col.row()
+        op = row.operator("anim.animtexture_sparse", text="Pack Sparse")
+        op.unpack = False
+        op = row.operator("anim.animtexture_sparse", text="Unpack")
+        op.unpack = True
+
+        row = col.row()
+        op = row.operator("anim.animtexture_bake", icon="RENDER_ANIMATION")
+        op.clear = False
+        op = row.operator("anim.animtexture_bake", text="Clear Bake")
+        op.clear = True
+
+        if context.preferences.addons[__package__].preferences.collectStats:
+            self.draw_stats(layout)
+
+    def draw_stats(self, layout):
+        box = layout.box()
+        report = stats.report()
+        row = box.row()
+        row.label(text="Timing")
+        op = row.operator("anim.animtexture_stats", text="", icon="EXPORT")
+        op.reset = False
+        op = row.operator("anim.animtexture_stats", text="", icon="TRASH")
+        op.reset = True
+        col = box.column(align=True)
+        for name, call in report["calls"].items():
+            row = col.row()
+            row.label(text=name)
+            row.label(text=str(call["count"]) + "x")
+            row.label(text="{:.1f} ms".format(call["total"] * 1000))
+            row.label(text="p95 {:.1f} ms".format(call["p95"] * 1000))
+        row = col.row()
+        for kind, count in report["bytes"].items():
+            row.label(text=kind + " {:.1f} MB".format(count / 2**20))
+
 
 # Add-ons Preferences Update Panel
 #
@@ -99,6 +154,9 @@ def update_checklinks(self, context):
     if context.preferences.addons[__package__].preferences.checklinks:
         handlers.load_post.append(ops.animtexture_checklinks)
 
+def update_stats(self, context):
+    stats.enabled = self.collectStats
+
 @persistent
 def update_savewithfile(self, context):
     if context.preferences.addons[__package__].preferences.savewithfile != 'DONT_SAVE':
@@ -121,8 +179,8 @@ class AnimtextureAddonPreferences(AddonPreferences):
     )
     checklinks: BoolProperty(
         name="Check for Missing Files",
-        description="Check for missing texture images when opening a file.",
-        default=False,
+        description="Check for missing texture images in the background when opening a file.",
+        default=True,
         update=update_checklinks
     )
     savewithfile: EnumProperty(
@@ -140,6 +198,57 @@ class AnimtextureAddonPreferences(AddonPreferences):
         description="Deleted unused image files and rename their indices when we save the animtexture sequence.",
         default=False
     )
+    asyncSave: BoolProperty(
+        name="Background Save",
+        description="Copy the pixels of painted keys, when the frame changes, so that they can be saved in the background. Needs more memory. Only 8 bit PNG sequences.",
+        default=False
+    )
+    prefetchCount: IntProperty(
+        name="Read-ahead Keys",
+        description="Number of upcoming key images, which are read on a background thread during playback. 0 disables read-ahead.",
+        default=0,
+        min=0, max=64
+    )
+    prefetchBudget: IntProperty(
+        name="Read-ahead Memory (MB)",
+        description="Size of the recently read files, which are expected to stay in the cache of the operating system. The files are not kept in Blender's memory.",
+        default=512,
+        min=16, max=65536
+    )
+    pixelCache: BoolProperty(
+        name="Pixel Cache",
+        description="Store decoded pixels of key images on disk, so that they are loaded without decoding next time.",
+        default=False
+    )
+    pixelCacheBudget: IntProperty(
+        name="Pixel Cache Size (MB)",
+        description="Size of the pixel cache. The least recently used images are removed, when it is full.",
+        default=4096,
+        min=64, max=1048576
+    )
+    pixelCacheDirectory: StringProperty(
+        name="Pixel Cache Directory",
+        description="Directory of the pixel cache. Empty uses the Blender user data directory.",
+        default="",
+        subtype="DIR_PATH"
+    )
+    onionOpacity: FloatProperty(
+        name="Onion Skin Opacity",
+        description="Opacity of the previous and next key in onion skins.",
+        default=0.3,
+        min=0.0, max=1.0
+    )
+    collectStats: BoolProperty(
+        name="Timing Statistics",
+        description="Measure the time of the AnimTexture handlers and operators and the bytes they read and write. Shown in the AnimTexture panel.",
+        default=False,
+        update=update_stats
+    )
+    lazyKeys: BoolProperty(
+        name="Lazy Keyframes",
+        description="New keyframes link to the template until they are painted and saved with the AnimTexture Save operator. Saves no disk space on Windows.",
+        default=False
+    )
 
     def draw(self, context):
         layout = self.layout
@@ -151,7 +260,17 @@ class AnimtextureAddonPreferences(AddonPreferences):
         col = row.column()
         row1 = col.row()
         row1.prop(self, "reorganizeOnSave")
+        row1.prop(self, "lazyKeys")
+        row1.prop(self, "asyncSave")
 
         col.prop(self, "savewithfile")
         col.prop(self, "checklinks")
+        col.prop(self, "prefetchCount")
+        col.prop(self, "prefetchBudget")
+        row1 = col.row()
+        row1.prop(self, "pixelCache")
+        row1.prop(self, "pixelCacheBudget")
+        col.prop(self, "pixelCacheDirectory")
+        col.prop(self, "onionOpacity")
+        col.prop(self, "collectStats")
 
@@ -0,0 +1,49 @@
+"""
+Compares the creation of a fill buffer for new images:
+a python list (old) and a preallocated float32 numpy array (new).
+Measures time and peak memory by resolution.
+
+Run with any python that has numpy (e.g. Blender's python):
+    python benchmark.py [max_resolution]
+"""
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+COLOR = (0.0, 0.0, 0.0, 0.0)
+
+
+def fill_list(pixel_count):
+    return list(COLOR) * pixel_count
+
+def fill_numpy(pixel_count):
+    buffer = np.empty(pixel_count * 4, dtype=np.float32)
+    buffer.reshape(-1, 4)[:] = COLOR
+    return buffer
+
+
+def measure(fill, pixel_count):
+    tracemalloc.start()
+    t = time.perf_counter()
+    buffer = fill(pixel_count)
+    duration = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del buffer
+    return duration, peak
+
+
+def main():
+    max_resolution = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    resolutions = [r for r in [512, 1024, 2048, 4096, 8192] if r <= max_resolution]
+    print("{:>10} {:>8} {:>12} {:>12}".format("resolution", "method", "time [s]", "peak [MB]"))
+    for r in resolutions:
+        for name, fill in [("list", fill_list), ("numpy", fill_numpy)]:
+            duration, peak = measure(fill, r * r)
+            print("{:>10} {:>8} {:>12.4f} {:>12.1f}".format(
+                str(r) + "x" + str(r), name, duration, peak / 2**20))
+
+
+if __name__ == "__main__":
+    main()
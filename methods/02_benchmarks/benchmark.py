@@ -0,0 +1,169 @@
+"""
+Times the hot paths of the addon on synthetic image sequences, without
+Blender (see fakebpy.py):
+
+    import       dedup import, without (cold) and with (warm) sidecar index
+    export       with and without fill_gaps, full and incremental
+    reorganize   clean_directory with renumbering
+    load check   the missing file check of animtexture_checklinks on file open
+    frame        update_texture per frame
+
+Run with any python that has numpy:
+    python benchmark.py [--keys 10 1000 10000] [--size 4096] [--repeat 3] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import fakebpy
+bpy = fakebpy.install()
+from animtexture import core, ops, keyframes, seqindex, fileops, nodeindex  # noqa: E402
+
+NAME = "AT_"
+# wide enough for the frames of the largest runs, wider numbers are not part of the sequence
+PADDING = 6
+EXT = ".png"
+# every key is held for HOLD frames
+HOLD = 2
+
+
+def create_source(dir: str, count: int, size: int):
+    """Writes a sequence of count * HOLD frames with `count` distinct images."""
+    os.makedirs(dir)
+    for i in range(count):
+        data = i.to_bytes(8, "little") * (size // 8)
+        for h in range(HOLD):
+            with open(os.path.join(dir, core.get_file_name(NAME, PADDING, EXT, i * HOLD + h)), "wb") as f:
+                f.write(data)
+    with open(os.path.join(dir, core.get_template(NAME + "0" * PADDING + EXT)), "wb") as f:
+        f.write(bytes(size))
+
+
+def timed(f, repeat: int = 1, setup=None) -> float:
+    """Returns the fastest of `repeat` runs in seconds. `setup` is not timed."""
+    best = float("inf")
+    for i in range(repeat):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def reset_caches():
+    seqindex._indices.clear()
+    keyframes.invalidate()
+    nodeindex.invalidate()
+    ops.displayed_numbers.clear()
+
+
+def run(count: int, size: int, repeat: int, tmp: str) -> list:
+    results = []
+    def record(case, seconds, per=None):
+        results.append({"case": case, "keys": count, "seconds": seconds,
+            "per_item_us": None if per is None else seconds / per * 1e6})
+
+    # the cached indices of the import sources stay in the temporary directory
+    seqindex.CACHE_DIR = os.path.join(tmp, "index")
+    source = os.path.join(tmp, "source")
+    create_source(source, count, size)
+    first = os.path.join(source, core.get_file_name(NAME, PADDING, EXT, 0))
+
+    # import
+    work = os.path.join(tmp, "work")
+    imported = {}
+    def setup_import(cold):
+        def setup():
+            shutil.rmtree(work, ignore_errors=True)
+            os.makedirs(work)
+            reset_caches()
+            if cold:
+                fileops.remove_existing(seqindex.get_cache_path(source))
+        return setup
+    def do_import():
+        imported["keys"], imported["count"], has_template = core.import_sequence(first, work)
+    record("import (cold index)", timed(do_import, 1, setup_import(True)))
+    record("import (warm index)", timed(do_import, repeat, setup_import(False)))
+    keys = imported["keys"]
+    assert imported["count"] == count, "imported a partial sequence"
+
+    # export
+    out = os.path.join(tmp, "out")
+    index = keyframes.KeyframeIndex(keys)
+    for case, frame_keys in [("export", index.keys()),
+            ("export fill_gaps", index.image_range(0, count * HOLD - 1))]:
+        files = core.get_export_files(frame_keys, NAME, PADDING, EXT)
+        def setup():
+            shutil.rmtree(out, ignore_errors=True)
+            os.makedirs(out)
+        record(case, timed(lambda: core.export_sequence(work, files, out, incremental=False),
+            repeat, setup))
+        record(case + " (incremental)", timed(lambda: core.export_sequence(work, files, out),
+            repeat))
+
+    # load check and per frame update, through the addon handlers
+    filepath = os.path.join(work, core.get_file_name(NAME, PADDING, EXT, 0))
+    tree, node = fakebpy.create_scene(bpy, filepath, keys)
+    reset_caches()
+    labels, sequences = ops.get_checklinks_sequences()
+    assert len(sequences) == 1 and len(sequences[0][1]) == count, "checks a stale node"
+    # the check itself runs in a background thread, timed without it
+    record("load check", timed(lambda: core.validate_all(ops.get_checklinks_sequences()[1]),
+        repeat, reset_caches))
+
+    scene = bpy.context.scene
+    frames = count * HOLD
+    def play():
+        for frame in range(frames):
+            scene.frame_current = frame
+            ops.update_texture(bpy.context)
+    seconds = timed(play, repeat, reset_caches)
+    record("frame update", seconds, frames)
+
+    # reorganize: the keys use every second image in reverse order
+    reorganize = os.path.join(tmp, "reorganize")
+    def setup_reorganize():
+        shutil.rmtree(reorganize, ignore_errors=True)
+        shutil.copytree(work, reorganize)
+        reset_caches()
+        tree, node = fakebpy.create_scene(bpy,
+            os.path.join(reorganize, core.get_file_name(NAME, PADDING, EXT, 0)),
+            [(frame, count - 1 - number) for frame, number in keys[::2]])
+        state["points"] = tree.animation_data.action.fcurves[0].keyframe_points
+        state["node"] = node
+    state = {}
+    record("reorganize", timed(lambda: ops.clean_directory(state["points"],
+        state["node"].image.filepath, state["node"]), repeat, setup_reorganize))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--size", type=int, default=4096, help="Bytes per image")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write the results to a json file")
+    args = parser.parse_args()
+
+    results = []
+    print("{:>28} {:>7} {:>12} {:>14}".format("case", "keys", "time [s]", "per item [us]"))
+    for count in args.keys:
+        with tempfile.TemporaryDirectory() as tmp:
+            for r in run(count, args.size, args.repeat, tmp):
+                results.append(r)
+                per = "" if r["per_item_us"] is None else "{:.2f}".format(r["per_item_us"])
+                print("{:>28} {:>7} {:>12.4f} {:>14}".format(r["case"], r["keys"], r["seconds"], per))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"size": args.size, "repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
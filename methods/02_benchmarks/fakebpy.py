@@ -0,0 +1,329 @@
+"""
+A minimal stand-in for `bpy`, so that the addon modules can be imported
+and their hot paths timed with a plain python interpreter.
+
+Only what the benchmarked functions touch is modelled: node trees with
+image texture nodes, actions with F-curves and keyframe points (including
+foreach_get/foreach_set), images, a context and the addon preferences.
+Everything else resolves to inert dummies.
+"""
+import sys
+import types
+
+PACKAGE = "animtexture"
+
+
+class Dummy():
+    """Accepts any call and attribute access."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Dummy()
+
+    def __getattr__(self, name):
+        return Dummy()
+
+    def __bool__(self):
+        return False
+
+
+class DummyModule(types.ModuleType):
+    """Module, whose unknown attributes are dummy classes (usable as base classes)."""
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        cls = type(name, (Dummy,), {})
+        setattr(self, name, cls)
+        return cls
+
+
+def property_factory(*args, **kwargs):
+    return None
+
+
+class PropsModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return property_factory
+
+
+# -- data ---------------------------------------------------------------------
+
+class Vector():
+    __slots__ = ["x", "y"]
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x, self.y = x, y
+
+
+class Keyframe():
+    __slots__ = ["co", "handle_left", "handle_right", "interpolation"]
+
+    def __init__(self, x=0.0, y=0.0):
+        self.co = Vector(x, y)
+        self.handle_left = Vector(x, y)
+        self.handle_right = Vector(x, y)
+        self.interpolation = 'CONSTANT'
+
+
+INTERPOLATION = ['CONSTANT', 'LINEAR', 'BEZIER']
+
+
+class KeyframePoints(list):
+    def add(self, count):
+        self.extend(Keyframe() for i in range(count))
+
+    def remove(self, point, fast=False):
+        list.remove(self, point)
+
+    def foreach_get(self, attr, out):
+        if attr in ["co", "handle_left", "handle_right"]:
+            values = []
+            for k in self:
+                v = getattr(k, attr)
+                values += [v.x, v.y]
+        elif attr == "interpolation":
+            values = [INTERPOLATION.index(k.interpolation) for k in self]
+        else:
+            values = [getattr(k, attr) for k in self]
+        out[:] = values
+
+    def insert(self, frame, value, options=set()):
+        for k in self:
+            if k.co.x == frame:
+                k.co.y = value
+                return k
+        k = Keyframe(frame, value)
+        self.append(k)
+        self.sort(key=lambda k: k.co.x)
+        return k
+
+    def foreach_set(self, attr, values):
+        values = list(values)
+        if attr in ["co", "handle_left", "handle_right"]:
+            for i, k in enumerate(self):
+                v = getattr(k, attr)
+                v.x, v.y = values[2 * i], values[2 * i + 1]
+        elif attr == "interpolation":
+            for k, v in zip(self, values):
+                k.interpolation = INTERPOLATION[v]
+        else:
+            for k, v in zip(self, values):
+                setattr(k, attr, v)
+
+
+class FCurve():
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.keyframe_points = KeyframePoints()
+
+    def as_pointer(self):
+        return id(self)
+
+    def update(self):
+        self.keyframe_points.sort(key=lambda k: k.co.x)
+
+
+class FCurves(list):
+    def find(self, data_path):
+        for fc in self:
+            if fc.data_path == data_path:
+                return fc
+        return None
+
+    def new(self, data_path):
+        fc = FCurve(data_path)
+        self.append(fc)
+        return fc
+
+
+class Action():
+    def __init__(self):
+        self.fcurves = FCurves()
+
+
+class AnimData():
+    def __init__(self):
+        self.action = Action()
+
+
+class IDProperties(dict):
+    """Base of datablocks and nodes with custom properties."""
+    def as_pointer(self):
+        return id(self)
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __bool__(self):
+        return True
+
+
+class ImageUser():
+    frame_start = 1
+    frame_duration = 1
+    frame_offset = 0
+    use_cyclic = False
+    use_auto_refresh = True
+
+
+class Image(IDProperties):
+    def __init__(self, name, filepath):
+        self.name = name
+        self.filepath = filepath
+        self.source = 'SEQUENCE'
+        self.is_dirty = False
+        self.file_format = 'PNG'
+
+
+class ImageNode(IDProperties):
+    type = 'TEX_IMAGE'
+
+    def __init__(self, name, image):
+        self.name = name
+        self.image = image
+        self.image_user = ImageUser()
+        self.animtextureproxy = 'NONE'
+        self.use_custom_color = False
+
+
+class Nodes(list):
+    active = None
+
+    def get(self, name, default=None):
+        for n in self:
+            if n.name == name:
+                return n
+        return default
+
+
+class NodeTree(IDProperties):
+    type = 'SHADER'
+
+    def __init__(self):
+        self.nodes = Nodes()
+        self.animation_data = AnimData()
+
+
+class Material(IDProperties):
+    def __init__(self, name):
+        self.name = name
+        self.use_nodes = True
+        self.node_tree = NodeTree()
+
+
+class MaterialSlot():
+    def __init__(self, material):
+        self.material = material
+
+
+class Object():
+    def __init__(self, material):
+        self.material_slots = [MaterialSlot(material)]
+        self.active_material_index = 0
+
+
+class Scene():
+    frame_current = 0
+    frame_start = 0
+    frame_end = 250
+
+
+class Preferences():
+    """Addon preferences with the defaults of `ui.AnimtextureAddonPreferences`."""
+    reorganizeOnSave = False
+    lazyKeys = False
+    asyncSave = False
+    prefetchCount = 0
+    prefetchBudget = 512
+    pixelCache = False
+    pixelCacheBudget = 4096
+    pixelCacheDirectory = ""
+    onionOpacity = 0.3
+    checklinks = False
+    savewithfile = 'DONT_SAVE'
+
+
+class Addon():
+    def __init__(self):
+        self.preferences = Preferences()
+
+
+class AddonPreferences():
+    def __init__(self):
+        self.addons = {PACKAGE: Addon()}
+
+
+class Context():
+    def __init__(self):
+        self.object = None
+        self.scene = Scene()
+        self.screen = None
+        self.preferences = AddonPreferences()
+        self.view_layer = Dummy()
+        self.window_manager = Dummy()
+
+
+class Data():
+    def __init__(self):
+        self.materials = []
+        self.worlds = []
+        self.lights = []
+        self.node_groups = []
+        self.screens = []
+        self.images = Dummy()
+
+
+def install():
+    """Registers the fake `bpy` in sys.modules. Returns the module."""
+    bpy = types.ModuleType("bpy")
+    bpy.types = DummyModule("bpy.types")
+    bpy.props = PropsModule("bpy.props")
+    bpy.ops = DummyModule("bpy.ops")
+    bpy.utils = DummyModule("bpy.utils")
+    bpy.msgbus = DummyModule("bpy.msgbus")
+    bpy.path = types.ModuleType("bpy.path")
+    bpy.path.abspath = lambda path: path
+    bpy.path.relpath = lambda path: path
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+    bpy.app.handlers.persistent = lambda f: f
+    for name in ["frame_change_pre", "load_pre", "load_post", "save_pre",
+            "depsgraph_update_post", "render_pre"]:
+        setattr(bpy.app.handlers, name, [])
+    bpy.app.timers = Dummy()
+    bpy.context = Context()
+    bpy.data = Data()
+    for name, module in [("bpy", bpy), ("bpy.types", bpy.types),
+            ("bpy.props", bpy.props), ("bpy.ops", bpy.ops),
+            ("bpy.utils", bpy.utils), ("bpy.msgbus", bpy.msgbus),
+            ("bpy.path", bpy.path), ("bpy.app", bpy.app),
+            ("bpy.app.handlers", bpy.app.handlers)]:
+        sys.modules[name] = module
+    return bpy
+
+
+def create_scene(bpy, filepath: str, keys):
+    """
+    Creates an object with a material, whose active image texture node
+    shows the sequence at `filepath` with animtexture keys [(frame, number)].
+    Returns the node tree and the node.
+    """
+    material = Material("Material")
+    tree = material.node_tree
+    node = ImageNode("Image Texture", Image("AT", filepath))
+    tree.nodes.append(node)
+    tree.nodes.active = node
+    fc = tree.animation_data.action.fcurves.new(
+        'nodes["' + node.name + '"].animtexturekey')
+    fc.keyframe_points.add(len(keys))
+    for point, (frame, number) in zip(fc.keyframe_points, keys):
+        point.co.x, point.co.y = frame, number
+    bpy.data.materials[:] = [material]
+    bpy.context.object = Object(material)
+    return tree, node